@@ -1,3 +1,5 @@
+import asyncio
+
 from dependency_injector.wiring import Provide
 from langchain_core.prompts import (
     PromptTemplate,
@@ -15,15 +17,33 @@ class GraderNode:
         model="gpt-4o-mini",
         db: DocRepository = Provide[Container.doc_repo],
     ):
-        prompt = PromptTemplate.from_template(
-            db.get_prompt_by_prompt_name("Grader Agent Prompt")
-        )
-        llm = ChatOpenAI(model=model, temperature=0.0).with_structured_output(
+        self.db = db
+        self.llm = ChatOpenAI(model=model, temperature=0.0).with_structured_output(
             GradeLLMResponse
         )
-        self.chain = prompt | llm
+        self.prompt_version = None
+        self.chain = None
+        self.refresh_prompt()
+
+    def refresh_prompt(self):
+        version = self.db.get_prompt_version()
+        if version == self.prompt_version:
+            return
+        prompt = PromptTemplate.from_template(
+            self.db.get_prompt_by_prompt_name("Grader Agent Prompt")
+        )
+        self.chain = prompt | self.llm
+        self.prompt_version = version
 
     def __call__(self, query, llm_response):
+        self.refresh_prompt()
         inputs = {"query": query, "llm_response": llm_response}
         result = self.chain.invoke(inputs)
         return result
+
+    async def acall(self, query, llm_response):
+        # a changed prompt is read from the db, keep that off the event loop
+        if self.db.get_prompt_version() != self.prompt_version:
+            await asyncio.to_thread(self.refresh_prompt)
+        inputs = {"query": query, "llm_response": llm_response}
+        return await self.chain.ainvoke(inputs)
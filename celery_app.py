@@ -0,0 +1,21 @@
+import os
+
+from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+INGESTION_QUEUE = "document-ingestion-queue"
+
+celery_app = Celery(
+    "ml",
+    broker=os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0"),
+    include=["commands.ingestion_tasks"],
+)
+
+celery_app.conf.update(
+    task_routes={"ml.ingest_documents": {"queue": INGESTION_QUEUE}},
+    # a job runs for minutes, only ack it once it has finished
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
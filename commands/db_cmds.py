@@ -17,3 +17,5 @@ class DbCmds:
     def __call__(self, command):
         if command == 'create-db':
             self.database.create_database()
+        elif command == 'create-indexes':
+            self.database.create_indexes()
@@ -1,24 +1,98 @@
+import asyncio
 import json
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
-import chromadb
-from chromadb import Settings
 from dependency_injector.wiring import inject, Provide
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
 
 import container
+from common import llm_models
+from common.reranker import LexicalOverlapReranker, OnnxCrossEncoderReranker
+from common.token_helper import count_tokens, split_by_tokens
 from entities.server_entities import ChatHistory
+from repositories.chroma_client_pool import ChromaClientPool
 from repositories.chroma_db_repo import DocRepository
+from repositories.lexical_index import LexicalIndex
 
 load_dotenv(".env")
 
-openai_embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=3072)
+DEFAULT_CONTEXT_WINDOW = 128_000
+RRF_K = 60
+
+SYSTEM_WHOLE_DOC_PROMPT = """## Objective
+You are an expert document search and Q&A assistant. Your goal is to accurately answer the user’s query by retrieving and presenting relevant information solely from the provided document context.
+
+## Input
+- **User Query:** The specific question or inquiry posed by the user.
+- **Context:** Passages retrieved from various documents based on the user's query.
+- **Chat History:** Previous interactions that may be relevant to the current query.
+
+## Instructions
+
+1. **Comprehend the Query:**  
+   Understand what the user is asking and identify the key aspects of their inquiry.
+
+2. **Synthesize a Single Comprehensive Answer:**  
+   Based on all the provided document contexts, craft one complete response that thoroughly addresses the user's query. Consolidate all relevant details, data points, and insights into a single, cohesive answer. The final output must be a single JSON object (one dictionary) that integrates all necessary information, without splitting the answer into multiple parts.
+
+3. **No Additional Content:**  
+   Do not include any extra commentary, notes, or explanations beyond the required answer output.
+
+4. **Extract Crucial Details:**  
+   Identify and extract all crucial details, data points, and nuanced insights that capture the document's main intent.
+
+5. **Identify Explicit and Implicit Information:**  
+   Capture both direct answers and any implied information from the context that may respond to the user query.
+
+6. **Versatile Document Types:**  
+   Be prepared to work with various document types (e.g., FAQ, reports, narratives, descriptions) and develop a clear understanding of the user's question using the provided context.
+
+7. **Handling No Match:**  
+   If, after thoroughly analyzing the context, no relevant answer can be found, return exactly:
+   ```
+   "No Data Found"
+   ```
+
+8. **Output Metadata:**  
+   Every output dictionary must include a `source_metadata` field formatted exactly as follows:
+   ```json
+   "source_metadata": {{ "doc_id": <number>, "source": "<filepath_or_document_source>" }}
+   ```
+   - Use this format for every instance where relevant information is found.
+
+## Output Format
+
+The final output should be a **single JSON object** (one dictionary) that includes the following keys:
+
+- **"source_metadata"**: A JSON array of objects, each containing the document's metadata in the precise format given above.
+- **"raw_context"**: An exact snippet or passage from the document that contains the relevant information.
+- **"summary"**: A concise summary that directly references the extracted snippet.
+- **"answer"**: A detailed explanation that integrates all the necessary information from the context into one complete response.
+
+### Expected Output Example
+
+```json
+{{
+    "source_metadata": [
+        {{ "doc_id": 1234, "source": "downloaded_docs/abcd.pdf" }},
+        {{ "doc_id": 5678, "source": "downloaded_docs/efgh.pdf" }}
+    ],
+    "raw_context": "Exact snippets from the document(s) with the relevant information.",
+    "summary": "A concise summary referencing the extracted snippet(s).",
+    "answer": "A detailed, comprehensive answer that integrates all the relevant information and insights into a single, unified response."
+}}
+```
+
+If no relevant information is found, the output must be exactly:
+
+```
+"No Data Found"
+```"""
 
 
 class AdvancedDocumentQAAgent:
@@ -28,67 +102,179 @@ class AdvancedDocumentQAAgent:
         model_name: str = "gpt-4o-mini",
         temperature: float = 0.0,
         db: DocRepository = Provide[container.Container.doc_repo],
+        chroma_pool: ChromaClientPool = Provide[container.Container.chroma_pool],
         verbose: bool = True,
+        lexical_index: Optional[LexicalIndex] = None,
+        lexical_k: int = 10,
+        retrieval_k: int = 4,
+        reranker: Optional[
+            Union[LexicalOverlapReranker, OnnxCrossEncoderReranker]
+        ] = None,
+        rerank_candidates: int = 12,
+        context_token_budget: int = 6_000,
+        max_document_tokens: int = 60_000,
+        section_tokens: int = 24_000,
+        response_reserve_tokens: int = 4_096,
+        map_concurrency: int = 4,
     ):
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.model_name = model_name
         self.llm = ChatOpenAI(model=model_name, temperature=temperature)
-        self.system_prompt = db.get_prompt_by_prompt_name("Chatbot System Prompt")
+        llm_model = llm_models.get_model_by_id(model_name)
+        self.context_window = (
+            llm_model.context_window if llm_model else DEFAULT_CONTEXT_WINDOW
+        )
+        self.max_document_tokens = max_document_tokens
+        self.section_tokens = section_tokens
+        self.response_reserve_tokens = response_reserve_tokens
+        self.map_concurrency = map_concurrency
+        self.db = db
+        self.chroma_pool = chroma_pool
         self.verbose = verbose
+        self.lexical_index = lexical_index
+        self.lexical_k = lexical_k
+        self.retrieval_k = retrieval_k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.context_token_budget = context_token_budget
+        self.system_whole_doc_prompt = SYSTEM_WHOLE_DOC_PROMPT
+        self.prompt_version = None
+        self.system_prompt = ""
+        self.refresh_system_prompt()
+
+    def refresh_system_prompt(self):
+        # the registry version only moves when the prompts table changed
+        version = self.db.get_prompt_version()
+        if version == self.prompt_version:
+            return
+        self.system_prompt = self.db.get_prompt_by_prompt_name("Chatbot System Prompt")
+        self.prompt_version = version
+
+    async def arefresh_system_prompt(self):
+        # a changed prompt is read from the db, keep that off the event loop
+        if self.db.get_prompt_version() != self.prompt_version:
+            await asyncio.to_thread(self.refresh_system_prompt)
 
     def get_chroma_client(self, collection_name: str):
         try:
-            http_client = chromadb.PersistentClient("./chroma_db")
-            # .HttpClient(
-            #     host="10.142.152.101",
-            #     port=8000,
-            #     ssl=False,
-            #     settings=Settings(anonymized_telemetry=False),
-            # ))
-
-            chroma_client = Chroma(
-                client=http_client,
-                collection_name=collection_name,
-                embedding_function=openai_embeddings,
-            )
-
-            return chroma_client
+            return self.chroma_pool.get_vector_store(collection_name)
 
         except Exception as e:
             self.log.error(f"Chroma client creation failed: {str(e)}")
             raise
 
-    def retrieve_documents(
-        self, query: str, collection_name: str, document_ids: Optional[List] = None
-    ):
-        try:
-            chroma_client = self.get_chroma_client(collection_name)
+    def get_retriever(self, collection_name: str, document_ids: Optional[List] = None):
+        chroma_client = self.get_chroma_client(collection_name)
+
+        # with a reranker configured over-fetch, the reranker picks the final k
+        k = self.rerank_candidates if self.reranker else self.retrieval_k
+        retriever = chroma_client.as_retriever(
+            search_type="mmr",
+            search_kwargs={
+                "k": k,
+                "fetch_k": max(10, 2 * k),
+                "lambda_mult": 0.90,
+            },
+        )
 
-            retriever = chroma_client.as_retriever(
-                search_type="mmr",
-                search_kwargs={"k": 4, "fetch_k": 10, "lambda_mult": 0.90},
-            )
+        if document_ids:
+            retriever.search_kwargs["filter"] = {"doc_id": {"$in": document_ids}}
+        return retriever
 
-            if document_ids:
-                retriever.search_kwargs["filter"] = {"doc_id": {"$in": document_ids}}
+    def format_results(self, results):
+        print("Results by retriever: ", results)
+        formatted_results = []
+        doc_ids = []
 
-            results = retriever.invoke(query)
-            print("Results by retriever: ", results)
-            formatted_results = []
-            doc_ids = []
+        for result in results:
+            doc_id = result.metadata.get("doc_id")
+            if doc_id and doc_id not in doc_ids:
+                doc_ids.append(doc_id)
 
-            for result in results:
-                doc_id = result.metadata.get("doc_id")
-                if doc_id and doc_id not in doc_ids:
-                    doc_ids.append(doc_id)
+            formatted_results.append(
+                {"content": result.page_content, "metadata": result.metadata}
+            )
 
-                formatted_results.append(
-                    {"content": result.page_content, "metadata": result.metadata}
-                )
+        return formatted_results, doc_ids
 
-            return formatted_results, doc_ids
+    def lexical_search(
+        self, query: str, collection_name: str, document_ids: Optional[List] = None
+    ) -> List[Document]:
+        if self.lexical_index is None:
+            return []
+        try:
+            results = self.lexical_index.search(
+                collection_name, query, self.lexical_k, document_ids
+            )
+        except Exception as e:
+            self.log.error(f"Lexical search failed: {str(e)}")
+            return []
+        return [
+            Document(page_content=result["content"], metadata=result["metadata"])
+            for result in results
+        ]
+
+    def fuse_results(self, vector_results, lexical_results) -> List[Document]:
+        """Reciprocal rank fusion of the MMR and bm25 rankings"""
+        limit = self.rerank_candidates if self.reranker else self.retrieval_k
+        if not lexical_results:
+            return vector_results[:limit]
+
+        scores, documents = {}, {}
+        for ranking in (vector_results, lexical_results):
+            for rank, document in enumerate(ranking, 1):
+                key = (document.metadata.get("doc_id"), document.page_content)
+                documents.setdefault(key, document)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [documents[key] for key in ranked]
+
+    def rerank_results(self, query: str, results: List[Document]) -> List[Document]:
+        """Keeps the best reranked k results that fit the context token budget"""
+        if self.reranker is None or not results:
+            return results
+
+        try:
+            scores = self.reranker.score(
+                query, [result.page_content for result in results]
+            )
+        except Exception as e:
+            self.log.error(f"Reranking failed, keeping retrieval order: {str(e)}")
+            scores = [-rank for rank in range(len(results))]
+
+        ranked = sorted(zip(scores, range(len(results))), reverse=True)
+        selected, used_tokens = [], 0
+        for _, idx in ranked:
+            tokens = count_tokens(results[idx].page_content, self.model_name)
+            if selected and used_tokens + tokens > self.context_token_budget:
+                continue
+            selected.append(results[idx])
+            used_tokens += tokens
+            if len(selected) == self.retrieval_k:
+                break
+        return selected
+
+    async def aretrieve_documents(
+        self, query: str, collection_name: str, document_ids: Optional[List] = None
+    ):
+        try:
+            retriever = self.get_retriever(collection_name, document_ids)
+            vector_results, lexical_results = await asyncio.gather(
+                retriever.ainvoke(query),
+                asyncio.to_thread(
+                    self.lexical_search, query, collection_name, document_ids
+                ),
+            )
+            results = self.fuse_results(vector_results, lexical_results)
+            # cross-encoder inference is cpu bound, keep it off the event loop
+            return self.format_results(
+                await asyncio.to_thread(self.rerank_results, query, results)
+            )
 
         except Exception as e:
             self.log.error(f"Document retrieval failed: {str(e)}")
+            self.chroma_pool.invalidate(collection_name)
             return [], []
 
     def format_context(self, results):
@@ -133,9 +319,9 @@ class AdvancedDocumentQAAgent:
 
         return "\n".join(history_texts)
 
-    def generate_answer(
+    def format_answer_prompt(
         self, query: str, context: str, chat_history: List[BaseMessage]
-    ) -> str:
+    ):
         print("System prompt: ", self.system_prompt)
         system_prompt = SystemMessage(content=self.system_prompt)
         chat_lst = [system_prompt]
@@ -147,129 +333,68 @@ class AdvancedDocumentQAAgent:
 
         chat_prompt = ChatPromptTemplate.from_messages(chat_lst)
         formatted_prompt = chat_prompt.format_messages(data="")
+        print("Formatted Prompt: ", formatted_prompt)
+        return formatted_prompt
+
+    async def agenerate_answer(
+        self, query: str, context: str, chat_history: List[BaseMessage]
+    ) -> str:
+        await self.arefresh_system_prompt()
+        formatted_prompt = self.format_answer_prompt(query, context, chat_history)
 
         try:
-            print("Formatted Prompt: ", formatted_prompt)
-            return self.llm.invoke(formatted_prompt)
+            return await self.llm.ainvoke(formatted_prompt)
 
         except Exception as e:
             self.log.error("Error running agent", exc_info=True)
             raise
 
-    def run_query(
+    async def astream_answer(
+        self, query: str, context: str, chat_history: List[BaseMessage]
+    ):
+        await self.arefresh_system_prompt()
+        formatted_prompt = self.format_answer_prompt(query, context, chat_history)
+
+        try:
+            async for chunk in self.llm.astream(formatted_prompt):
+                yield chunk
+
+        except Exception as e:
+            self.log.error("Error streaming agent answer", exc_info=True)
+            raise
+
+    async def arun_query(
         self,
         query: str,
         collection_name: str,
         document_ids: Optional[List[int]] = None,
         chat_history: Optional[List[ChatHistory]] = None,
-        custom_system_prompt: Optional[str] = None,
     ) -> Dict[str, Any]:
-
-        self.log.info(f"Running query: {query} on collection: {collection_name}")
+        self.log.info(f"Running async query: {query} on collection: {collection_name}")
 
         processed_history = self.process_chat_history(chat_history)
-        print("Processed History: ", processed_history)
-
-        self.log.info(f"Retrieving documents from collection: {collection_name}")
-
-        results, found_doc_ids = self.retrieve_documents(
+        results, found_doc_ids = await self.aretrieve_documents(
             query, collection_name, document_ids
         )
-        print("Results: ",results)
         context = self.format_context(results)
-        # print("Context: ",context)
 
-        intermediate_steps = []
-
-        if results:
-            intermediate_steps.append(("document_search", json.dumps(results)))
-            # print("Intermediate Steps: ", intermediate_steps)
         if context:
             self.log.info("Generating answer using RAG")
-            answer = self.generate_answer(query, context, processed_history)
+            answer = await self.agenerate_answer(query, context, processed_history)
         else:
             self.log.warning("No relevant documents found")
             answer = "No Data Found"
 
         return {"output": answer, "found_doc_ids": found_doc_ids}
 
-    def run_query_on_entire_document(
+    def format_whole_document_prompt(
         self,
         query: str,
         metadata: Dict[str, str],
         doc_content: str,
         chat_history: Optional[List[ChatHistory]] = None,
         custom_system_prompt: Optional[str] = None,
-    ):
-        self.system_whole_doc_prompt = """## Objective
-You are an expert document search and Q&A assistant. Your goal is to accurately answer the user’s query by retrieving and presenting relevant information solely from the provided document context.
-
-## Input
-- **User Query:** The specific question or inquiry posed by the user.
-- **Context:** Passages retrieved from various documents based on the user's query.
-- **Chat History:** Previous interactions that may be relevant to the current query.
-
-## Instructions
-
-1. **Comprehend the Query:**  
-   Understand what the user is asking and identify the key aspects of their inquiry.
-
-2. **Synthesize a Single Comprehensive Answer:**  
-   Based on all the provided document contexts, craft one complete response that thoroughly addresses the user's query. Consolidate all relevant details, data points, and insights into a single, cohesive answer. The final output must be a single JSON object (one dictionary) that integrates all necessary information, without splitting the answer into multiple parts.
-
-3. **No Additional Content:**  
-   Do not include any extra commentary, notes, or explanations beyond the required answer output.
-
-4. **Extract Crucial Details:**  
-   Identify and extract all crucial details, data points, and nuanced insights that capture the document's main intent.
-
-5. **Identify Explicit and Implicit Information:**  
-   Capture both direct answers and any implied information from the context that may respond to the user query.
-
-6. **Versatile Document Types:**  
-   Be prepared to work with various document types (e.g., FAQ, reports, narratives, descriptions) and develop a clear understanding of the user's question using the provided context.
-
-7. **Handling No Match:**  
-   If, after thoroughly analyzing the context, no relevant answer can be found, return exactly:
-   ```
-   "No Data Found"
-   ```
-
-8. **Output Metadata:**  
-   Every output dictionary must include a `source_metadata` field formatted exactly as follows:
-   ```json
-   "source_metadata": {{ "doc_id": <number>, "source": "<filepath_or_document_source>" }}
-   ```
-   - Use this format for every instance where relevant information is found.
-
-## Output Format
-
-The final output should be a **single JSON object** (one dictionary) that includes the following keys:
-
-- **"source_metadata"**: A JSON array of objects, each containing the document's metadata in the precise format given above.
-- **"raw_context"**: An exact snippet or passage from the document that contains the relevant information.
-- **"summary"**: A concise summary that directly references the extracted snippet.
-- **"answer"**: A detailed explanation that integrates all the necessary information from the context into one complete response.
-
-### Expected Output Example
-
-```json
-{{
-    "source_metadata": [
-        {{ "doc_id": 1234, "source": "downloaded_docs/abcd.pdf" }},
-        {{ "doc_id": 5678, "source": "downloaded_docs/efgh.pdf" }}
-    ],
-    "raw_context": "Exact snippets from the document(s) with the relevant information.",
-    "summary": "A concise summary referencing the extracted snippet(s).",
-    "answer": "A detailed, comprehensive answer that integrates all the relevant information and insights into a single, unified response."
-}}
-```
-
-If no relevant information is found, the output must be exactly:
-
-```
-"No Data Found"
-```"""
+    ) -> str:
         processed_history = (
             self.process_chat_history(chat_history) if chat_history else []
         )
@@ -301,15 +426,100 @@ If no relevant information is found, the output must be exactly:
             ),
         )
 
+        formatted_prompt = prompt_template.format(
+            query=query,
+            metadata=json.dumps(metadata),
+            doc_content=doc_content,
+            chat_history=history_text,
+        )
+        print(formatted_prompt)
+        return formatted_prompt
+
+    def plan_whole_document_prompts(
+        self,
+        query: str,
+        metadata: Dict[str, str],
+        doc_content: str,
+        chat_history: Optional[List[ChatHistory]] = None,
+        custom_system_prompt: Optional[str] = None,
+    ) -> List[str]:
+        """One prompt when the document fits the token budget, else one per section"""
+        doc_content = doc_content or ""
+        prompt = self.format_whole_document_prompt(
+            query, metadata, doc_content, chat_history, custom_system_prompt
+        )
+        prompt_tokens = count_tokens(prompt, self.model_name)
+        doc_tokens = count_tokens(doc_content, self.model_name)
+        if (
+            doc_tokens <= self.max_document_tokens
+            and prompt_tokens + self.response_reserve_tokens <= self.context_window
+        ):
+            return [prompt]
+
+        overhead_tokens = prompt_tokens - doc_tokens
+        section_tokens = max(
+            1,
+            min(
+                self.section_tokens,
+                self.context_window - self.response_reserve_tokens - overhead_tokens,
+            ),
+        )
+        sections = split_by_tokens(doc_content, section_tokens, self.model_name)
+        self.log.info(
+            f"Document of {doc_tokens} tokens split into {len(sections)} sections "
+            f"of up to {section_tokens} tokens"
+        )
+        return [
+            self.format_whole_document_prompt(
+                query,
+                {**metadata, "section": f"{idx}/{len(sections)}"},
+                section,
+                chat_history,
+                custom_system_prompt,
+            )
+            for idx, section in enumerate(sections, 1)
+        ]
+
+    @staticmethod
+    def is_no_data_answer(content: str) -> bool:
+        return content.strip().strip("`").strip().strip('"').lower() == "no data found"
+
+    def get_section_answers(self, responses) -> Optional[str]:
+        answers = [
+            response.content
+            for response in responses
+            if not self.is_no_data_answer(response.content)
+        ]
+        if not answers:
+            return None
+        return "\n\n".join(
+            f"[Section answer {idx}]\n{answer}" for idx, answer in enumerate(answers, 1)
+        )
+
+    async def arun_query_on_entire_document(
+        self,
+        query: str,
+        metadata: Dict[str, str],
+        doc_content: str,
+        chat_history: Optional[List[ChatHistory]] = None,
+        custom_system_prompt: Optional[str] = None,
+    ):
         try:
-            formatted_prompt = prompt_template.format(
-                query=query,
-                metadata=json.dumps(metadata),
-                doc_content=doc_content,
-                chat_history=history_text,
+            prompts = self.plan_whole_document_prompts(
+                query, metadata, doc_content, chat_history, custom_system_prompt
+            )
+            if len(prompts) == 1:
+                return await self.llm.ainvoke(prompts[0])
+
+            responses = await self.llm.abatch(
+                prompts, config={"max_concurrency": self.map_concurrency}
+            )
+            section_answers = self.get_section_answers(responses)
+            if section_answers is None:
+                return responses[0]
+            return await self.arun_query_on_entire_document(
+                query, metadata, section_answers, chat_history, custom_system_prompt
             )
-            print(formatted_prompt)
-            return self.llm.invoke(formatted_prompt)
 
         except Exception as e:
             self.log.error("Error processing document", exc_info=True)
@@ -1,6 +1,11 @@
+import asyncio
 import logging
 import os
-from typing import List
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
 from pptx import Presentation
 import pandas as pd
 from dependency_injector.wiring import inject, Provide
@@ -15,16 +20,30 @@ from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from agents.grader_agent import GraderNode
+from celery_app import celery_app
 from commands.document_qa_chat import AdvancedDocumentQAAgent
 from common.aws_fs_helper import AwsS3FsHelper
+from common.s3_file_cache import S3FileCache
 from container import Container
-from entities.server_entities import QueryResponse, QueryRequest, KnowledgeStore
+from entities.server_entities import (
+    QueryResponse,
+    QueryRequest,
+    KnowledgeStore,
+    FileData,
+    FileUploadStatus,
+    DocumentInput,
+    IngestionJob,
+)
+from repositories import ingestion_job_repo
+from repositories.answer_cache import AnswerCache
+from repositories.chroma_client_pool import ChromaClientPool
 from repositories.chroma_db_repo import DocRepository, openai_embeddings
 from repositories.document_qa_repo import DocumentQADBRepository
-from .ocr_service import get_ocr_text
+from repositories.ingestion_job_repo import IngestionJobRepository
+from .ocr_service import get_ocr_page_batches, get_sharded_ocr_text
 
-SAVE_DIR = "downloaded_docs"
 CHROMA_PERSIST_DIR = "chroma_db"
+PAGE_METADATA_KEYS = ("page_start", "page_end", "slide_number", "sheet_name")
 
 
 class ExcelLoader(BaseLoader):
@@ -66,38 +85,60 @@ class PowerPointLoader(BaseLoader):
 
 class HandleDocumentChunks:
     def __init__(
-        self, s3_helper: AwsS3FsHelper, file_path: str, doc_id: int, file_type: str
+        self,
+        s3_helper: AwsS3FsHelper,
+        file_path: str,
+        doc_id: int,
+        file_type: str,
+        file_cache: S3FileCache,
+        status_callback: Optional[Callable[[str], None]] = None,
     ):
         self.s3_helper = s3_helper
+        self.file_cache = file_cache
         self.file_path = file_path
         self.doc_id = doc_id
         self.file_type = file_type
+        self.status_callback = status_callback
         self.local_file_path = None
+        self.full_text = None
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
-    def create_local_path(self):
-        return os.path.join(SAVE_DIR, os.path.basename(self.file_path))
+    def report_status(self, status: str):
+        if self.status_callback:
+            self.status_callback(status)
 
     def get_loaded_document(self):
         self.log.info("Document loader executed.")
 
         if self.file_type == "url":
+            self.report_status(ingestion_job_repo.DOWNLOADING)
             return WebBaseLoader(web_path=self.file_path).load()
 
         ext = os.path.splitext(self.file_path)[-1]
-        self.local_file_path = self.create_local_path()
-        print(self.file_path, self.local_file_path)
-        self.s3_helper.download_to(f"s3://{self.file_path}", self.local_file_path)
+        self.report_status(ingestion_job_repo.DOWNLOADING)
+        # the cached file is shared with other readers, it is never removed here
+        self.local_file_path = self.file_cache.get_file(
+            self.s3_helper, f"s3://{self.file_path}"
+        )
         if ext == ".docx":
             return UnstructuredWordDocumentLoader(
                 file_path=self.local_file_path, mode="elements", strategy="fast"
             ).load()
         if ext == ".pdf":
-            docs = Document(
-                page_content=get_ocr_text(self.local_file_path),
-                metadata={"source": f"s3://{self.file_path}"},
-            )
-            return [docs]
+            self.report_status(ingestion_job_repo.OCR)
+            return [
+                Document(
+                    page_content=text,
+                    metadata={
+                        "source": f"s3://{self.file_path}",
+                        "page_start": page_start,
+                        "page_end": page_end,
+                    },
+                )
+                for page_start, page_end, text in get_ocr_page_batches(
+                    self.local_file_path
+                )
+            ]
         if ext == ".txt":
             return TextLoader(self.local_file_path).load()
 
@@ -116,12 +157,21 @@ class HandleDocumentChunks:
 
         for doc in documents:
             metadata = doc.metadata
-            source = metadata.get("source", "")
+            # loaders report the local cache path, which changes with every ETag
+            source = (
+                metadata.get("source", "")
+                if self.file_type == "url"
+                else f"s3://{self.file_path}"
+            )
             doc_id = self.doc_id
+            chunk_metadata = {"source": source, "doc_id": doc_id}
+            for key in PAGE_METADATA_KEYS:
+                if key in metadata:
+                    chunk_metadata[key] = metadata[key]
 
             processed_docs.append(
                 Document(
-                    metadata={"source": source, "doc_id": doc_id},
+                    metadata=chunk_metadata,
                     page_content=doc.page_content,
                 )
             )
@@ -137,8 +187,7 @@ class HandleDocumentChunks:
 
     def get_document_chunks(self):
         documents = self.get_loaded_document()
-        if self.file_type == "file":
-            os.remove(self.local_file_path)
+        self.full_text = "\n\n".join(doc.page_content for doc in documents)
         documents = self.split_document_chunks(documents)
         return self.add_metadata_document(documents)
 
@@ -147,11 +196,20 @@ class DocumentService:
     @inject
     def __init__(
         self,
-        s3_helper: AwsS3FsHelper = Provide[Container.s3_helper],
+        s3_helper_provider: Callable[..., AwsS3FsHelper] = Provide[
+            Container.s3_helper.provider
+        ],
         doc_repo: DocRepository = Provide[Container.doc_repo],
+        answer_cache: AnswerCache = Provide[Container.answer_cache],
+        file_cache: S3FileCache = Provide[Container.s3_file_cache],
+        max_workers: int = Provide[Container.config.ingestion.max_workers],
     ):
         self.doc_repo = doc_repo
-        self.s3_helper = s3_helper
+        self.s3_helper_provider = s3_helper_provider
+        self.answer_cache = answer_cache
+        self.file_cache = file_cache
+        self.max_workers = max_workers
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
     @staticmethod
     def format_file_path(file_path, file_type):
@@ -163,6 +221,41 @@ class DocumentService:
             embedding_function=openai_embeddings,
         )
 
+    def upload_input_doc(
+        self,
+        index_id: str,
+        index_name: str,
+        operation: str,
+        file_type: str,
+        file_info,
+        status_callback: Optional[Callable[[str], None]] = None,
+    ):
+        # s3_helper is a thread-local singleton, resolve it on the worker thread
+        doc_id = file_info.fileId
+        chunk_handler = HandleDocumentChunks(
+            self.s3_helper_provider(),
+            file_info.filePath,
+            doc_id,
+            file_type,
+            self.file_cache,
+            status_callback=status_callback,
+        )
+        doc_chunks = chunk_handler.get_document_chunks()
+
+        if status_callback:
+            status_callback(ingestion_job_repo.EMBEDDING)
+        self.doc_repo.upload_document(
+            self.format_file_path(file_info.filePath, file_type),
+            doc_id,
+            index_id,
+            index_name,
+            operation,
+            file_type,
+            doc_chunks,
+        )
+        # full text serves the whole document fallback without s3 or OCR
+        self.doc_repo.save_document_text(index_id, doc_id, chunk_handler.full_text)
+
     def upload_input_docs(
         self,
         index_id: str,
@@ -170,48 +263,215 @@ class DocumentService:
         operation: str,
         file_type: str,
         file_data: List,
-    ):
+        max_workers: Optional[int] = None,
+        status_callback: Optional[Callable[[int, str, Optional[str]], None]] = None,
+    ) -> List[FileUploadStatus]:
+        """status_callback(file_id, status, message) follows each file's progress"""
+        file_data = file_data or []
+        if not file_data:
+            return []
+
+        def file_status_callback(file_id):
+            if status_callback is None:
+                return None
+            return lambda status: status_callback(file_id, status, None)
+
+        # the configured pool size caps what a request may ask for
+        workers = max(
+            1, min(max_workers or self.max_workers, self.max_workers, len(file_data))
+        )
+        statuses = [None] * len(file_data)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_idx = {
+                executor.submit(
+                    self.upload_input_doc,
+                    index_id,
+                    index_name,
+                    operation,
+                    file_type,
+                    file_info,
+                    file_status_callback(file_info.fileId),
+                ): idx
+                for idx, file_info in enumerate(file_data)
+            }
+            for future in as_completed(future_to_idx):
+                idx = future_to_idx[future]
+                file_info = file_data[idx]
+                try:
+                    future.result()
+                    statuses[idx] = FileUploadStatus(
+                        fileId=file_info.fileId, success=True
+                    )
+                except Exception as e:
+                    self.log.error(
+                        "Ingestion failed for file %s", file_info.filePath, exc_info=True
+                    )
+                    statuses[idx] = FileUploadStatus(
+                        fileId=file_info.fileId, success=False, message=str(e)
+                    )
+                if status_callback:
+                    status = statuses[idx]
+                    status_callback(
+                        status.fileId,
+                        ingestion_job_repo.DONE
+                        if status.success
+                        else ingestion_job_repo.FAILED,
+                        status.message,
+                    )
 
-        for file_info in file_data:
-            doc_id = file_info.fileId
-            doc_chunks = HandleDocumentChunks(
-                self.s3_helper, file_info.filePath, doc_id, file_type
-            ).get_document_chunks()
-
-            self.doc_repo.upload_document(
-                self.format_file_path(file_info.filePath, file_type),
-                doc_id,
-                index_id,
-                index_name,
-                operation,
-                file_type,
-                doc_chunks,
-            )
-        return True
+        self.answer_cache.invalidate(index_id)
+        self.log.info(
+            "Ingested %d files into '%s' with %d workers, %d failed",
+            len(file_data),
+            index_id,
+            workers,
+            sum(1 for status in statuses if not status.success),
+        )
+        return statuses
 
     def get_all_docs(self, index_id: str):
         return self.doc_repo.get_all_docs(index_id)
 
+    def rebuild_lexical_index(self, index_id: str) -> int:
+        return self.doc_repo.rebuild_lexical_index(index_id)
+
     def delete_docs(self, index_id: str, file_data: List):
         for file_info in file_data:
             doc_id = file_info.fileId
             self.doc_repo.delete_by_id(doc_id, index_id)
+        self.answer_cache.invalidate(index_id)
         return True
 
     def delete_index(self, index_id: str):
-        return self.doc_repo.delete_index(index_id)
+        response = self.doc_repo.delete_index(index_id)
+        self.answer_cache.invalidate(index_id)
+        return response
+
+
+class IngestionJobService:
+    @inject
+    def __init__(
+        self,
+        job_repo: IngestionJobRepository = Provide[Container.ingestion_job_repo],
+        chroma_pool: ChromaClientPool = Provide[Container.chroma_pool],
+    ):
+        self.job_repo = job_repo
+        self.chroma_pool = chroma_pool
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+    def is_available(self) -> bool:
+        # workers write from their own processes, embedded chroma would keep
+        # those vectors out of the api's collections
+        return self.chroma_pool.is_shared
+
+    def submit_job(self, document: DocumentInput) -> str:
+        if not self.is_available():
+            raise RuntimeError("Ingestion jobs require a chroma server (chroma.host)")
+        job_id = uuid.uuid4().hex
+        index_id = str(document.id)
+        file_data = document.data or []
+        self.job_repo.create_job(job_id, index_id, file_data)
+
+        try:
+            celery_app.send_task(
+                "ml.ingest_documents",
+                args=[
+                    job_id,
+                    index_id,
+                    document.name,
+                    document.operation,
+                    document.type,
+                    [file_info.model_dump() for file_info in file_data],
+                    document.concurrency,
+                ],
+            )
+        except Exception as e:
+            self.log.error("Failed to queue ingestion job %s", job_id, exc_info=True)
+            for file_info in file_data:
+                self.job_repo.set_file_status(
+                    job_id, file_info.fileId, ingestion_job_repo.FAILED, str(e)
+                )
+            raise
+        return job_id
+
+    def run_job(
+        self,
+        job_id: str,
+        index_id: str,
+        index_name: str,
+        operation: str,
+        file_type: str,
+        file_data: List[dict],
+        max_workers: Optional[int] = None,
+    ) -> List[FileUploadStatus]:
+        self.log.info(f"Running ingestion job '{job_id}' for '{index_id}'")
+        if not self.is_available():
+            message = "Ingestion jobs require a chroma server (chroma.host)"
+            for file_info in file_data:
+                self.job_repo.set_file_status(
+                    job_id, file_info["fileId"], ingestion_job_repo.FAILED, message
+                )
+            raise RuntimeError(message)
+
+        def report(file_id, status, message=None):
+            self.job_repo.set_file_status(job_id, file_id, status, message)
+
+        return DocumentService().upload_input_docs(
+            index_id,
+            index_name,
+            operation,
+            file_type,
+            [FileData(**file_info) for file_info in file_data],
+            max_workers=max_workers,
+            status_callback=report,
+        )
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.job_repo.get_job(job_id)
 
 
-def get_knowledge_store_format(found_doc_ids, knowledge_data) -> KnowledgeStore:
+def get_knowledge_store_format(
+    found_doc_ids, knowledge_data, partial=False
+) -> KnowledgeStore:
     return KnowledgeStore(
         id=knowledge_data.id,
         name=knowledge_data.name,
         type=knowledge_data.type,
         documentIds=found_doc_ids,
+        partial=partial,
     )
 
 
-def process_entire_document(file_path, query, source_file_path, doc_id):
+class KnowledgeStoreAnswer:
+    """Best answer produced so far by one knowledge store pipeline"""
+
+    def __init__(self, knowledge_data):
+        self.knowledge_data = knowledge_data
+        self.answer = "No Data Found"
+        self.raw_context = "No Data Found"
+        self.found_doc_ids = []
+        self.validation = None
+        self.complete = False
+        self.cache_generation = None
+        self._lock = threading.Lock()
+
+    def update(
+        self, answer, raw_context, found_doc_ids, complete=False, validation=None
+    ):
+        with self._lock:
+            self.answer = answer
+            self.raw_context = raw_context
+            self.found_doc_ids = found_doc_ids
+            self.validation = validation
+            self.complete = complete
+
+    def snapshot(self):
+        with self._lock:
+            return self.answer, self.raw_context, list(self.found_doc_ids), self.complete
+
+
+def load_entire_document(file_path):
     extension = file_path.split(".")[-1]
     doc_content = None
 
@@ -220,118 +480,317 @@ def process_entire_document(file_path, query, source_file_path, doc_id):
         documents = loader.load()
         doc_content = "\n\n".join([doc.page_content for doc in documents])
     elif extension == "pdf":
-        doc_content = get_ocr_text(file_path)
+        doc_content = get_sharded_ocr_text(file_path)
     elif extension == "txt":
         with open(file_path, "r", encoding="utf-8") as f:
             doc_content = f.read()
-
-    qa_agent = AdvancedDocumentQAAgent()
-    response = qa_agent.run_query_on_entire_document(
-        query=query.question,
-        metadata={"source": source_file_path, "doc_id": doc_id},
-        doc_content=doc_content,
-        chat_history=query.historyList,
-    )
-    return response
+    elif extension in ("csv", "xlsx", "pptx"):
+        loader = {
+            "csv": CSVLoader,
+            "xlsx": ExcelLoader,
+            "pptx": PowerPointLoader,
+        }[extension](file_path)
+        doc_content = "\n\n".join([doc.page_content for doc in loader.load()])
+    return doc_content
 
 
 class DocChatService:
     @inject
     def __init__(
         self,
-        s3_helper: AwsS3FsHelper = Provide[Container.s3_helper],
+        s3_helper_provider: Callable[..., AwsS3FsHelper] = Provide[
+            Container.s3_helper.provider
+        ],
         doc_repo: DocRepository = Provide[Container.doc_repo],
         document_repo: DocumentQADBRepository = Provide[Container.document_qa_repo],
+        qa_agent: AdvancedDocumentQAAgent = Provide[Container.qa_agent],
+        grader: GraderNode = Provide[Container.grader],
+        answer_cache: AnswerCache = Provide[Container.answer_cache],
+        file_cache: S3FileCache = Provide[Container.s3_file_cache],
+        max_workers: int = Provide[Container.config.chat.max_workers],
+        deadline_seconds: float = Provide[Container.config.chat.deadline_seconds],
+        fallback_max_documents: int = Provide[
+            Container.config.chat.fallback_max_documents
+        ],
     ):
         self.doc_repo = doc_repo
-        self.s3_helper = s3_helper
+        self.s3_helper_provider = s3_helper_provider
         self.document_repo = document_repo
+        self.qa_agent = qa_agent
+        self.grader = grader
+        self.answer_cache = answer_cache
+        self.file_cache = file_cache
+        self.max_workers = max_workers
+        self.deadline_seconds = deadline_seconds
+        self.fallback_max_documents = fallback_max_documents
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
-    def document_chat(self, query: QueryRequest) -> QueryResponse:
-        qa_agent = AdvancedDocumentQAAgent()
-        query_answers, raw_contexts, knowledge_stores = [], [], []
-        # print(query.historyList)
-        for knowledge_data in query.knowledgeStoreList:
-            llm_response = self.fetch_llm_response(qa_agent, query, knowledge_data)
-            print(f"LLM Response: {llm_response}")
-            grader = GraderNode()
-            grader_response = grader(query.question, llm_response.get("output"))
+    async def adocument_chat(self, query: QueryRequest) -> QueryResponse:
+        store_answers = [
+            KnowledgeStoreAnswer(knowledge_data)
+            for knowledge_data in query.knowledgeStoreList
+        ]
+
+        if store_answers:
+            semaphore = asyncio.Semaphore(max(1, self.max_workers))
+            tasks = {
+                asyncio.create_task(
+                    self.aanswer_knowledge_store(query, store_answer, semaphore)
+                ): store_answer
+                for store_answer in store_answers
+            }
+            done, pending = await asyncio.wait(tasks, timeout=self.deadline_seconds)
+
+            for task in done:
+                if task.exception() is not None:
+                    self.log.error(
+                        f"Knowledge store {tasks[task].knowledge_data.id} failed",
+                        exc_info=task.exception(),
+                    )
+            for task in pending:
+                self.log.warning(
+                    f"Knowledge store {tasks[task].knowledge_data.id} missed the "
+                    f"{self.deadline_seconds}s deadline, returning partial result"
+                )
+                task.cancel()
 
-            if not grader_response:
-                raise ValueError("Grader response is None or empty")
+        return self.build_query_response(query, store_answers)
 
-            print(f"Grader Response: {grader_response}")
+    def build_query_response(self, query, store_answers) -> QueryResponse:
+        query_answers, raw_contexts, knowledge_stores = [], [], []
+        for store_answer in store_answers:
+            answer, raw_context, found_doc_ids, complete = store_answer.snapshot()
+            query_answers.append(answer)
+            raw_contexts.append(raw_context)
+            knowledge_stores.append(
+                get_knowledge_store_format(
+                    found_doc_ids, store_answer.knowledge_data, partial=not complete
+                )
+            )
 
-            response = None
-            grader_response_for_whole_doc = None
-            found_doc_ids = []
+        return QueryResponse(
+            id=query.id,
+            question=query.question,
+            answer=query_answers[0] if query_answers else "No Data Found",
+            raw_context=raw_contexts[0] if raw_contexts else "No Data Found",
+            knowledgeStoreList=knowledge_stores,
+        )
 
-            if self.is_incorrect_response(grader_response):
-                found_doc_ids = llm_response.get("found_doc_ids", [])
-                self.log.info(f"Doc ID List: {found_doc_ids}")
+    def load_cached_answer(self, query, store_answer: KnowledgeStoreAnswer) -> bool:
+        # answers to follow up questions depend on the history, never cache them
+        if query.historyList:
+            return False
+        knowledge_data = store_answer.knowledge_data
+        collection = str(knowledge_data.id)
+        store_answer.cache_generation = self.answer_cache.get_generation(collection)
+        cached = self.answer_cache.get(
+            collection, knowledge_data.documentIds, query.question
+        )
+        if cached is None:
+            return False
+
+        self.log.info(f"Answer cache hit for knowledge store {collection}")
+        store_answer.update(
+            cached["answer"],
+            cached["raw_context"],
+            cached["found_doc_ids"],
+            complete=True,
+            validation=cached["validation"],
+        )
+        return True
 
-                if found_doc_ids:
-                    self.log.info(
-                        "Fetching LLM response by processing entire document..."
-                    )
-                    response, grader_response_for_whole_doc, found_doc_ids = (
-                        self.get_llm_response_by_processing_whole_document(
-                            doc_id_list=found_doc_ids, query=query, grader=grader
-                        )
-                    )
-            else:
-                found_doc_ids = llm_response.get("found_doc_ids", [])
+    def save_cached_answer(self, query, store_answer: KnowledgeStoreAnswer):
+        if query.historyList:
+            return
+        answer, raw_context, found_doc_ids, complete = store_answer.snapshot()
+        validation = store_answer.validation
+        if (
+            not complete
+            or answer == "No Data Found"
+            or (validation or "").lower() == "incorrect"
+        ):
+            return
+
+        knowledge_data = store_answer.knowledge_data
+        self.answer_cache.put(
+            str(knowledge_data.id),
+            knowledge_data.documentIds,
+            query.question,
+            {
+                "answer": answer,
+                "raw_context": raw_context,
+                "found_doc_ids": found_doc_ids,
+                "validation": validation,
+            },
+            generation=store_answer.cache_generation,
+        )
 
-            final_answer = (
-                grader_response_for_whole_doc.answer
-                if grader_response_for_whole_doc
-                else grader_response.answer
-            )
-            final_raw_context = (
-                grader_response_for_whole_doc.raw_context
-                if grader_response_for_whole_doc
-                else grader_response.raw_context
+    async def aanswer_knowledge_store(
+        self, query, store_answer: KnowledgeStoreAnswer, semaphore: asyncio.Semaphore
+    ):
+        # the similarity tier may embed the question, keep it off the event loop
+        if await asyncio.to_thread(self.load_cached_answer, query, store_answer):
+            return
+
+        async with semaphore:
+            knowledge_data = store_answer.knowledge_data
+            llm_response = await self.qa_agent.arun_query(
+                query=query.question,
+                collection_name=str(knowledge_data.id),
+                document_ids=knowledge_data.documentIds,
+                chat_history=query.historyList,
             )
+            await self.agrade_llm_response(query, store_answer, llm_response)
+        await asyncio.to_thread(self.save_cached_answer, query, store_answer)
 
-            query_answers.append(final_answer)
-            raw_contexts.append(final_raw_context)
+    async def agrade_llm_response(
+        self, query, store_answer: KnowledgeStoreAnswer, llm_response
+    ):
+        grader_response = await self.grader.acall(
+            query.question, llm_response.get("output")
+        )
 
-            self.log.info(
-                f"Final Answer: {final_answer}\n"
-                f"Raw Context: {final_raw_context}\n"
-                f"Found Doc IDs: {found_doc_ids}"
-            )
+        if not grader_response:
+            raise ValueError("Grader response is None or empty")
 
-            final_doc_ids = []
-            if final_answer != "No Data Found":
-                final_doc_ids = found_doc_ids
-            else:
-                for i in found_doc_ids:
-                    if i not in final_doc_ids:
-                        final_doc_ids.append(i)
-            self.log.info(f"Final Document IDs: {final_doc_ids}")
+        found_doc_ids = llm_response.get("found_doc_ids", [])
+        grader_response_for_whole_doc = None
 
-            knowledge_stores.append(
-                get_knowledge_store_format(final_doc_ids, knowledge_data)
+        if self.is_incorrect_response(grader_response) and found_doc_ids:
+            store_answer.update(
+                grader_response.answer,
+                grader_response.raw_context,
+                self.get_final_doc_ids(grader_response.answer, found_doc_ids),
+                validation=grader_response.validation,
+            )
+            self.log.info("Fetching LLM response by processing entire document...")
+            response, grader_response_for_whole_doc, found_doc_ids = (
+                await self.aget_llm_response_by_processing_whole_document(
+                    doc_id_list=found_doc_ids,
+                    query=query,
+                    index_id=str(store_answer.knowledge_data.id),
+                )
             )
 
-        return QueryResponse(
-            id=query.id,
-            question=query.question,
-            answer=query_answers[0] if query_answers else "No Data Found",
-            raw_context=raw_contexts[0] if raw_contexts else "No Data Found",
-            knowledgeStoreList=knowledge_stores,
+        final_response = grader_response_for_whole_doc or grader_response
+        final_doc_ids = self.get_final_doc_ids(final_response.answer, found_doc_ids)
+        store_answer.update(
+            final_response.answer,
+            final_response.raw_context,
+            final_doc_ids,
+            complete=True,
+            validation=final_response.validation,
         )
 
-    def fetch_llm_response(self, qa_agent, query, knowledge_data):
-        self.log.info(f"Fetching LLM response for query: {query.question}")
-        return qa_agent.run_query(
-            query=query.question,
-            collection_name=str(knowledge_data.id),
-            document_ids=knowledge_data.documentIds,
-            chat_history=query.historyList,
+    async def astream_knowledge_store(self, query, store_answer: KnowledgeStoreAnswer):
+        if await asyncio.to_thread(self.load_cached_answer, query, store_answer):
+            yield {"event": "token", "data": store_answer.answer}
+            return
+
+        knowledge_data = store_answer.knowledge_data
+        results, found_doc_ids = await self.qa_agent.aretrieve_documents(
+            query.question, str(knowledge_data.id), knowledge_data.documentIds
         )
+        context = self.qa_agent.format_context(results)
+
+        output = "No Data Found"
+        if context:
+            processed_history = self.qa_agent.process_chat_history(query.historyList)
+            output = None
+            async for chunk in self.qa_agent.astream_answer(
+                query.question, context, processed_history
+            ):
+                output = chunk if output is None else output + chunk
+                if chunk.content:
+                    yield {"event": "token", "data": chunk.content}
+        else:
+            yield {"event": "token", "data": output}
+
+        await self.agrade_llm_response(
+            query, store_answer, {"output": output, "found_doc_ids": found_doc_ids}
+        )
+        await asyncio.to_thread(self.save_cached_answer, query, store_answer)
+
+    async def astream_document_chat(self, query: QueryRequest):
+        """Yields answer tokens of the first knowledge store, then a final event"""
+        started_at = time.monotonic()
+        store_answers = [
+            KnowledgeStoreAnswer(knowledge_data)
+            for knowledge_data in query.knowledgeStoreList
+        ]
+
+        tasks, stream = {}, None
+        try:
+            if store_answers:
+                semaphore = asyncio.Semaphore(max(1, self.max_workers))
+                # the streamed store is the one that answers, the rest run alongside
+                tasks = {
+                    asyncio.create_task(
+                        self.aanswer_knowledge_store(query, store_answer, semaphore)
+                    ): store_answer
+                    for store_answer in store_answers[1:]
+                }
+                stream = self.astream_knowledge_store(query, store_answers[0])
+                try:
+                    while True:
+                        event = await asyncio.wait_for(
+                            stream.__anext__(), self.get_remaining_seconds(started_at)
+                        )
+                        yield event
+                except StopAsyncIteration:
+                    pass
+                except asyncio.TimeoutError:
+                    self.log.warning(
+                        f"Knowledge store {store_answers[0].knowledge_data.id} missed "
+                        f"the {self.deadline_seconds}s deadline, returning partial result"
+                    )
+                except Exception as e:
+                    self.log.error("Streaming document chat failed", exc_info=True)
+                    yield {"event": "error", "data": str(e)}
+
+                if tasks:
+                    await asyncio.wait(
+                        tasks, timeout=self.get_remaining_seconds(started_at)
+                    )
+
+            response = self.build_query_response(query, store_answers)
+            yield {
+                "event": "final",
+                "data": {
+                    **response.model_dump(),
+                    "validation": store_answers[0].validation if store_answers else None,
+                },
+            }
+        finally:
+            # also reached when the client disconnects and the generator is closed
+            if stream is not None:
+                await stream.aclose()
+            for task, store_answer in tasks.items():
+                if not task.done():
+                    self.log.warning(
+                        f"Knowledge store {store_answer.knowledge_data.id} cancelled "
+                        f"before it finished"
+                    )
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is not None:
+                    self.log.error(
+                        f"Knowledge store {store_answer.knowledge_data.id} failed",
+                        exc_info=task.exception(),
+                    )
+
+    def get_remaining_seconds(self, started_at: float) -> float:
+        return max(0, self.deadline_seconds - (time.monotonic() - started_at))
+
+    @staticmethod
+    def get_final_doc_ids(final_answer, found_doc_ids):
+        final_doc_ids = []
+        if final_answer != "No Data Found":
+            final_doc_ids = found_doc_ids
+        else:
+            for i in found_doc_ids:
+                if i not in final_doc_ids:
+                    final_doc_ids.append(i)
+        return final_doc_ids
 
     def is_incorrect_response(self, grader_response):
         return (
@@ -339,29 +798,93 @@ class DocChatService:
             or grader_response.answer.lower() == "no data found"
         )
 
-    def get_llm_response_by_processing_whole_document(self, doc_id_list, query, grader):
-        doc_id = doc_id_list[0]
+    def load_whole_document(self, index_id: str, doc_id: int):
         source_file_path = self.document_repo.get_source_path_by_doc_id(doc_id=doc_id)
-
-        file_path = self.s3_helper.download_to(
-            source_file_path, os.path.join(SAVE_DIR, os.path.basename(source_file_path))
+        doc_content = self.doc_repo.get_document_text(index_id, doc_id)
+        if doc_content is not None:
+            return source_file_path, doc_content
+
+        # ingested before texts were stored, parse the source once and keep it
+        self.log.info(f"No stored text for document {doc_id}, loading it from source")
+        file_path = self.file_cache.get_file(
+            self.s3_helper_provider(), source_file_path
         )
-
-        response = process_entire_document(
-            file_path=file_path,
-            query=query,
-            source_file_path=source_file_path,
-            doc_id=doc_id,
+        doc_content = load_entire_document(file_path)
+
+        if doc_content:
+            self.doc_repo.save_document_text(index_id, doc_id, doc_content)
+        return source_file_path, doc_content
+
+    def get_fallback_candidates(self, doc_id_list):
+        return list(dict.fromkeys(doc_id_list))[: max(1, self.fallback_max_documents)]
+
+    def pick_whole_document_result(self, candidates, results, doc_id_list):
+        # nothing graded correct, keep the answer of the best ranked document
+        for doc_id in candidates:
+            if doc_id in results:
+                response, grader_response = results[doc_id]
+                return response, grader_response, doc_id_list
+        return None, None, doc_id_list
+
+    async def aevaluate_whole_document(self, index_id, doc_id, query):
+        # db lookup and a possible s3 download and OCR are blocking
+        source_file_path, doc_content = await asyncio.to_thread(
+            self.load_whole_document, index_id, doc_id
         )
 
+        response = await self.qa_agent.arun_query_on_entire_document(
+            query=query.question,
+            metadata={"source": source_file_path, "doc_id": doc_id},
+            doc_content=doc_content,
+            chat_history=query.historyList,
+        )
         self.log.info(f"Response from processing entire doc (ID: {doc_id}): {response}")
 
-        grader_response = grader(query.question, response)
+        grader_response = await self.grader.acall(query.question, response)
         self.log.info(
             f"Grader response for entire doc (ID: {doc_id}): {grader_response}"
         )
+        return response, grader_response
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
-        return response, grader_response, doc_id_list
+    async def aget_llm_response_by_processing_whole_document(
+        self, doc_id_list, query, index_id
+    ):
+        candidates = self.get_fallback_candidates(doc_id_list)
+        results = {}
+
+        tasks = {
+            asyncio.create_task(
+                self.aevaluate_whole_document(index_id, doc_id, query)
+            ): doc_id
+            for doc_id in candidates
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    doc_id = tasks[task]
+                    try:
+                        response, grader_response = task.result()
+                    except Exception:
+                        self.log.error(
+                            f"Whole document fallback failed for doc {doc_id}",
+                            exc_info=True,
+                        )
+                        continue
+
+                    results[doc_id] = (response, grader_response)
+                    if grader_response and not self.is_incorrect_response(
+                        grader_response
+                    ):
+                        return response, grader_response, [doc_id] + [
+                            i for i in doc_id_list if i != doc_id
+                        ]
+        finally:
+            # first correct answer wins, stop paying for the other documents
+            for task in pending:
+                task.cancel()
+
+        return self.pick_whole_document_result(candidates, results, doc_id_list)
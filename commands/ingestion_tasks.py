@@ -0,0 +1,12 @@
+from celery_app import celery_app
+from commands.document_service import IngestionJobService
+
+
+@celery_app.task(name="ml.ingest_documents")
+def ingest_documents(
+    job_id, index_id, index_name, operation, file_type, file_data, max_workers=None
+):
+    statuses = IngestionJobService().run_job(
+        job_id, index_id, index_name, operation, file_type, file_data, max_workers
+    )
+    return [status.model_dump() for status in statuses]
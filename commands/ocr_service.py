@@ -1,11 +1,25 @@
+import logging
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
 import dotenv
+import pymupdf
 from google import genai
 
+from common.ocr_cache import OcrCache, get_file_hash
+
 dotenv.load_dotenv()
 
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+log = logging.getLogger(__name__)
+
+OCR_MODEL = "gemini-2.0-flash"
+PAGES_PER_BATCH = 10
+MAX_CONCURRENT_BATCHES = 4
+
+ocr_cache = OcrCache("./ocr_cache")
 
 prompt = "Extract all text from the attached PDF using OCR and output the results in a well-structured Markdown (.md) format. Preserve the original formatting as much as possible. Do not include any additional explanations, comments, or modifications beyond the extracted content."
 
@@ -13,7 +27,7 @@ prompt = "Extract all text from the attached PDF using OCR and output the result
 def get_ocr_text(file_path, prompt=prompt):
     sample_pdf = client.files.upload(file=file_path)
     response = client.models.generate_content(
-        model="gemini-2.0-flash",
+        model=OCR_MODEL,
         contents=[
             prompt,
             sample_pdf,
@@ -25,6 +39,78 @@ def get_ocr_text(file_path, prompt=prompt):
     return text
 
 
+def get_ocr_page_batches(
+    file_path,
+    prompt=prompt,
+    pages_per_batch=PAGES_PER_BATCH,
+    max_workers=MAX_CONCURRENT_BATCHES,
+) -> List[Tuple[int, int, str]]:
+    """Reads through the OCR cache, keyed by file content and OCR settings"""
+    file_hash = get_file_hash(file_path)
+    version = OcrCache.get_version(OCR_MODEL, pages_per_batch, prompt)
+    batches = ocr_cache.get(file_hash, version)
+    if batches is not None:
+        log.info("OCR cache hit for %s", file_path)
+        return batches
+
+    batches = ocr_page_batches(
+        file_path,
+        prompt=prompt,
+        pages_per_batch=pages_per_batch,
+        max_workers=max_workers,
+    )
+    try:
+        ocr_cache.put(file_hash, version, batches)
+    except OSError:
+        log.warning("Failed to store OCR cache entry for %s", file_path, exc_info=True)
+    return batches
+
+
+def ocr_page_batches(
+    file_path,
+    prompt=prompt,
+    pages_per_batch=PAGES_PER_BATCH,
+    max_workers=MAX_CONCURRENT_BATCHES,
+) -> List[Tuple[int, int, str]]:
+    """OCRs the pdf in page batches, returns (page_start, page_end, text) in page order"""
+    with pymupdf.open(file_path) as doc:
+        page_count = doc.page_count
+        if page_count <= pages_per_batch:
+            return [(1, max(page_count, 1), get_ocr_text(file_path, prompt=prompt))]
+
+        with tempfile.TemporaryDirectory(prefix="ocr_batches_") as batch_dir:
+            batches = []
+            for start in range(0, page_count, pages_per_batch):
+                end = min(start + pages_per_batch, page_count) - 1
+                batch_path = os.path.join(batch_dir, f"pages_{start + 1}_{end + 1}.pdf")
+                with pymupdf.open() as batch_doc:
+                    batch_doc.insert_pdf(doc, from_page=start, to_page=end)
+                    batch_doc.save(batch_path)
+                batches.append((start + 1, end + 1, batch_path))
+
+            log.info(
+                "OCR of %s split into %d batches of %d pages",
+                file_path,
+                len(batches),
+                pages_per_batch,
+            )
+            workers = max(1, min(max_workers, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                texts = executor.map(
+                    lambda batch: get_ocr_text(batch[2], prompt=prompt), batches
+                )
+                return [
+                    (page_start, page_end, text)
+                    for (page_start, page_end, _), text in zip(batches, texts)
+                ]
+
+
+def get_sharded_ocr_text(file_path, prompt=prompt) -> str:
+    return "\n\n".join(
+        text for _, _, text in get_ocr_page_batches(file_path, prompt=prompt)
+    )
+
+
 if __name__ == "__main__":
     markdown_sample = """
 # Physician’s Progress Note  
@@ -0,0 +1,82 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import List, Optional
+
+import boto3
+from dependency_injector.wiring import Provide, inject
+
+from common.aws_fs_helper import AwsS3FsHelper, get_bucket_prefix
+from container import Container
+
+MB = 1024 * 1024
+
+
+class S3DownloadBenchmark:
+    """Wall and cpu time of each download mode of AwsS3FsHelper
+
+    endpoint_url points the helper at a local stand-in such as moto or MinIO.
+    """
+
+    MODES = {
+        "stream-8k": lambda helper, path, local: helper.download_to(
+            path, local, parallel=False, chunk_size=8092
+        ),
+        "stream-8mb": lambda helper, path, local: helper.download_to(
+            path, local, parallel=False
+        ),
+        "parallel": lambda helper, path, local: helper.download_to(path, local),
+        "memory": lambda helper, path, local: helper.get_bytes(path),
+    }
+
+    @inject
+    def __init__(
+        self,
+        s3_helper: AwsS3FsHelper = Provide[Container.s3_helper],
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.s3_helper = s3_helper
+
+    @staticmethod
+    def create_helper(endpoint_url: str) -> AwsS3FsHelper:
+        session = boto3.session.Session()
+        return AwsS3FsHelper(
+            s3=session.resource("s3", endpoint_url=endpoint_url),
+            s3_client=session.client("s3", endpoint_url=endpoint_url),
+        )
+
+    def __call__(
+        self,
+        s3_path: str,
+        repeat: int = 3,
+        modes: Optional[List[str]] = None,
+        endpoint_url: Optional[str] = None,
+    ) -> List[dict]:
+        helper = self.create_helper(endpoint_url) if endpoint_url else self.s3_helper
+        bucket, prefix = get_bucket_prefix(s3_path)
+        size = helper.s3.Object(bucket, prefix).content_length
+
+        rows = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = os.path.join(tmp_dir, os.path.basename(prefix))
+            for mode in modes or list(self.MODES):
+                wall, cpu = [], []
+                for _ in range(repeat):
+                    started, started_cpu = time.perf_counter(), time.process_time()
+                    self.MODES[mode](helper, s3_path, local_path)
+                    wall.append(time.perf_counter() - started)
+                    cpu.append(time.process_time() - started_cpu)
+                seconds = statistics.median(wall)
+                rows.append(
+                    {
+                        "mode": mode,
+                        "size_mb": size / MB,
+                        "seconds": seconds,
+                        "cpu_seconds": statistics.median(cpu),
+                        "mb_per_second": size / MB / seconds if seconds else 0.0,
+                    }
+                )
+                self.log.info(f"S3 download benchmark: {rows[-1]}")
+        return rows
@@ -0,0 +1,156 @@
+import logging
+from typing import List
+
+import numpy as np
+from dependency_injector.wiring import Provide, inject
+
+from container import Container
+from repositories.chroma_client_pool import ChromaClientPool
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    # text-embedding-3 is matryoshka trained, a prefix renormalized is a valid embedding
+    vectors = vectors[:, :dimensions]
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def quantize_int8(vectors: np.ndarray):
+    scale = np.abs(vectors).max(axis=0) / 127.0 + 1e-12
+    return np.round(vectors / scale).astype(np.int8), scale
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def hamming_scores(queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    # negative hamming distance so that higher is better like cosine
+    return -np.stack(
+        [POPCOUNT[np.bitwise_xor(query, vectors)].sum(axis=1) for query in queries]
+    )
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = [len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)]
+    return float(np.mean(hits))
+
+
+class VectorBenchmark:
+    """Recall@k of reduced and quantized vectors against full dimension search
+
+    Stored chunk vectors double as queries, each query's own chunk is excluded,
+    so the benchmark runs offline without embedding calls.
+    """
+
+    @inject
+    def __init__(
+        self,
+        chroma_pool: ChromaClientPool = Provide[Container.chroma_pool],
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.chroma_pool = chroma_pool
+
+    def load_vectors(self, index_id: str) -> np.ndarray:
+        # the full dimension collection is stored under the bare index id
+        collection = self.chroma_pool.client.get_collection(index_id)
+        result = collection.get(include=["embeddings"])
+        return np.asarray(result["embeddings"], dtype=np.float32)
+
+    def rescore(self, candidates, queries, vectors, k):
+        rescored = []
+        for query, ids in zip(queries, candidates):
+            scores = vectors[ids] @ query
+            rescored.append(ids[np.argsort(-scores)[:k]])
+        return np.asarray(rescored)
+
+    def __call__(
+        self,
+        index_id: str,
+        dimensions: List[int],
+        k: int = 10,
+        num_queries: int = 200,
+        rescore_factor: int = 4,
+        seed: int = 0,
+    ) -> List[dict]:
+        vectors = truncate(self.load_vectors(index_id), None)
+        count = len(vectors)
+        if count <= k:
+            raise ValueError(f"Collection '{index_id}' has only {count} vectors")
+
+        rng = np.random.default_rng(seed)
+        query_idx = rng.choice(count, size=min(num_queries, count), replace=False)
+
+        def search(scores):
+            scores = scores.astype(np.float32)
+            scores[np.arange(len(query_idx)), query_idx] = -np.inf
+            return scores
+
+        baseline = top_k(search(vectors[query_idx] @ vectors.T), k)
+        fetch_k = k * rescore_factor
+        rows = []
+
+        for dims in dimensions:
+            reduced = truncate(vectors, dims)
+            queries = reduced[query_idx]
+
+            float_found = top_k(search(queries @ reduced.T), k)
+            rows.append(self.row(dims, "float32", False, dims * 4, float_found, baseline))
+
+            int8_vectors, scale = quantize_int8(reduced)
+            int8_queries = np.round(queries / scale).astype(np.int8)
+            int8_scores = search(
+                int8_queries.astype(np.int32) @ int8_vectors.astype(np.int32).T
+            )
+            rows.append(
+                self.row(dims, "int8", False, dims, top_k(int8_scores, k), baseline)
+            )
+            rows.append(
+                self.row(
+                    dims,
+                    "int8",
+                    True,
+                    dims,
+                    self.rescore(top_k(int8_scores, fetch_k), queries, reduced, k),
+                    baseline,
+                )
+            )
+
+            binary_scores = search(
+                hamming_scores(quantize_binary(queries), quantize_binary(reduced))
+            )
+            rows.append(
+                self.row(
+                    dims, "binary", False, dims // 8, top_k(binary_scores, k), baseline
+                )
+            )
+            rows.append(
+                self.row(
+                    dims,
+                    "binary",
+                    True,
+                    dims // 8,
+                    self.rescore(top_k(binary_scores, fetch_k), queries, reduced, k),
+                    baseline,
+                )
+            )
+        return rows
+
+    @staticmethod
+    def row(dims, precision, rescored, bytes_per_vector, found, baseline) -> dict:
+        return {
+            "dimensions": dims,
+            "precision": precision,
+            "rescored": rescored,
+            "bytes_per_vector": bytes_per_vector,
+            "recall": recall(found, baseline),
+        }
@@ -4,6 +4,7 @@ import os
 import urllib.parse
 from io import BytesIO
 
+from boto3.s3.transfer import TransferConfig
 from pydantic import BaseModel
 
 from common.fs_helper import FsHelper
@@ -11,6 +12,28 @@ from common.readers import Reader
 from common.writers import Writer
 
 
+MB = 1024 * 1024
+# objects above the threshold are fetched as parallel ranged GETs of PART_SIZE
+MULTIPART_THRESHOLD = 16 * MB
+PART_SIZE = 8 * MB
+MAX_CONCURRENCY = 8
+STREAM_BUFFER_SIZE = 8 * MB
+
+
+def get_transfer_config(
+    multipart_threshold: int = MULTIPART_THRESHOLD,
+    part_size: int = PART_SIZE,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        io_chunksize=MB,
+        use_threads=max_concurrency > 1,
+    )
+
+
 class S3File(BaseModel):
     """Holds s3 bucket and prefix"""
 
@@ -84,10 +107,11 @@ class AwsS3Writer(Writer):
 
 
 class AwsS3FsHelper(FsHelper):
-    def __init__(self, s3, s3_client):
+    def __init__(self, s3, s3_client, transfer_config: TransferConfig = None):
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.s3 = s3
         self.s3_client = s3_client
+        self.transfer_config = transfer_config or get_transfer_config()
 
     def exists(self, path_fragment: str):
         self.log.debug("Check if file exists for path_fragment=%s", path_fragment)
@@ -122,10 +146,19 @@ class AwsS3FsHelper(FsHelper):
         return s3file
 
     def get_bytes(self, path_fragment) -> BytesIO:
-        bucket, prefix = get_bucket_prefix(path_fragment)
-        obj = self.s3.ObjectSummary(bucket, prefix)
-        result = obj.get()
-        return BytesIO(result["Body"].read())
+        """Whole object in memory, for loaders that read file objects"""
+        data = BytesIO()
+        self.download_fileobj(path_fragment, data)
+        data.seek(0)
+        return data
+
+    def download_fileobj(self, from_path, fileobj):
+        # the resource's client, the accelerated s3_client needs bucket support
+        bucket, prefix = get_bucket_prefix(from_path)
+        self.s3.meta.client.download_fileobj(
+            bucket, prefix, fileobj, Config=self.transfer_config
+        )
+        return fileobj
 
     def get_reader(self, path_fragment, encoding=None) -> Reader:
         s3file = self.get_s3file(path_fragment)
@@ -159,17 +192,38 @@ class AwsS3FsHelper(FsHelper):
     def move(self, from_path, to_path):
         pass
 
-    def download_to(self, from_path, to_local_path, chunk_size=8092):
+    def download_to(
+        self,
+        from_path,
+        to_local_path,
+        parallel=True,
+        chunk_size=STREAM_BUFFER_SIZE,
+        extra_args=None,
+    ):
+        """parallel=False streams one GET through chunk_size sized buffers
+
+        extra_args are GetObject arguments such as VersionId, with parallel=True
+        s3transfer only accepts its ALLOWED_DOWNLOAD_ARGS (no IfMatch).
+        """
         self.log.debug("Downloading file %s => %s", from_path, to_local_path)
         bucket, prefix = get_bucket_prefix(from_path)
-        print(bucket, prefix)
-        obj = self.s3.ObjectSummary(bucket, prefix)
-        result = obj.get()
+        if parallel:
+            # s3transfer writes to a temporary name and renames when complete
+            self.s3.meta.client.download_file(
+                bucket,
+                prefix,
+                to_local_path,
+                ExtraArgs=extra_args,
+                Config=self.transfer_config,
+            )
+            return to_local_path
+
+        result = self.s3.meta.client.get_object(
+            Bucket=bucket, Key=prefix, **(extra_args or {})
+        )
         with open(to_local_path, "wb") as fp:
-            data = result["Body"].read(chunk_size)
-            while data is not None and len(data) > 0:
+            for data in result["Body"].iter_chunks(chunk_size):
                 fp.write(data)
-                data = result["Body"].read(chunk_size)
         return to_local_path
 
     def upload_to(self, local_path, to_path):
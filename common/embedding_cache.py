@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+SQLITE_MAX_PARAMS = 500
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Caches document vectors by model, dimensions and normalized text hash
+
+    Query vectors live in a separate in-memory LRU with a TTL, concurrent
+    lookups of the same question wait for a single embedding call.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        dimensions: int,
+        cache_dir: str = "./embedding_cache",
+        max_memory_items: int = 20_000,
+        max_query_items: int = 1024,
+        query_ttl_seconds: float = 3600,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, "embeddings.sqlite")
+        self.max_memory_items = max_memory_items
+        self.max_query_items = max_query_items
+        self.query_ttl_seconds = query_ttl_seconds
+
+        self._memory = OrderedDict()
+        self._queries = OrderedDict()
+        self._query_locks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.query_embed_seconds = 0.0
+        self.query_embed_max_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get_key(self, text: str) -> str:
+        payload = f"{self.model}:{self.dimensions}:{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, keys: List[str]) -> dict:
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[start : start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _disk_put(self, items: dict):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes())
+                    for key, vector in items.items()
+                ],
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.get_key(text) for text in texts]
+        vectors = {}
+
+        for key in keys:
+            vector = self._memory_get(key)
+            if vector is not None:
+                vectors[key] = vector
+        memory_hits = len(vectors)
+
+        missing = list({key for key in keys if key not in vectors})
+        disk_vectors = self._disk_get(missing) if missing else {}
+        for key, vector in disk_vectors.items():
+            vectors[key] = vector
+            self._memory_put(key, vector)
+
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in to_embed:
+                to_embed[key] = text
+
+        if to_embed:
+            embedded = self.embeddings.embed_documents(list(to_embed.values()))
+            new_vectors = dict(zip(to_embed.keys(), embedded))
+            self._disk_put(new_vectors)
+            for key, vector in new_vectors.items():
+                vectors[key] = vector
+                self._memory_put(key, vector)
+
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += len(disk_vectors)
+            self.misses += len(to_embed)
+
+        return [vectors[key] for key in keys]
+
+    def _query_get(self, key: str):
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                return None
+            vector, created_at = entry
+            if time.monotonic() - created_at >= self.query_ttl_seconds:
+                del self._queries[key]
+                return None
+            self._queries.move_to_end(key)
+            return vector
+
+    def _query_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._queries[key] = (vector, time.monotonic())
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_query_items:
+                self._queries.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.get_key(text)
+        vector = self._query_get(key)
+        if vector is not None:
+            with self._lock:
+                self.query_hits += 1
+            return vector
+
+        with self._lock:
+            key_lock = self._query_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # another thread may have embedded it while we waited
+                vector = self._query_get(key)
+                if vector is not None:
+                    with self._lock:
+                        self.query_hits += 1
+                    return vector
+
+                started_at = time.perf_counter()
+                vector = self.embeddings.embed_query(text)
+                elapsed = time.perf_counter() - started_at
+                self._query_put(key, vector)
+                with self._lock:
+                    self.query_misses += 1
+                    self.query_embed_seconds += elapsed
+                    self.query_embed_max_seconds = max(
+                        self.query_embed_max_seconds, elapsed
+                    )
+                return vector
+        finally:
+            with self._lock:
+                if self._query_locks.get(key) is key_lock and not key_lock.locked():
+                    del self._query_locks[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            query_lookups = self.query_hits + self.query_misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+                ),
+                "query_items": len(self._queries),
+                "query_hits": self.query_hits,
+                "query_misses": self.query_misses,
+                "query_hit_rate": (
+                    self.query_hits / query_lookups if query_lookups else 0.0
+                ),
+                "query_embed_ms_avg": (
+                    self.query_embed_seconds / self.query_misses * 1000
+                    if self.query_misses
+                    else 0.0
+                ),
+                "query_embed_ms_max": self.query_embed_max_seconds * 1000,
+            }
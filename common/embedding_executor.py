@@ -0,0 +1,207 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import openai
+import redis
+from langchain_core.embeddings import Embeddings
+
+from common.token_helper import count_tokens
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Blocks until the requested number of tokens fits the per minute budget"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        # a batch above the capacity would never fit, let it drain the bucket
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RedisTokenBucket:
+    """TokenBucket shared by every process that uses the same redis key"""
+
+    # refills by the elapsed time and takes the tokens in one step, returns the
+    # milliseconds to wait when they do not fit yet
+    ACQUIRE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens >= requested then
+  tokens = tokens - requested
+else
+  wait = math.ceil((requested - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return wait
+"""
+
+    def __init__(self, tokens_per_minute: int, redis_url: str, key: str):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60000.0
+        self.key = key
+        self.client = redis.Redis.from_url(redis_url)
+        self.script = self.client.register_script(self.ACQUIRE_SCRIPT)
+
+    def acquire(self, tokens: int) -> float:
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            wait_ms = self.script(keys=[self.key], args=[self.capacity, self.rate, tokens])
+            if not wait_ms:
+                return waited
+            delay = wait_ms / 1000.0
+            time.sleep(delay)
+            waited += delay
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeds in token sized batches under a rate limit, retrying 429s with jitter"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        max_batch_tokens: int = 100_000,
+        max_batch_size: int = 512,
+        max_concurrency: int = 4,
+        tokens_per_minute: int = 1_000_000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        bucket: TokenBucket = None,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.embeddings = embeddings
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # embedders of different dimensions share the account's rate limit
+        self.bucket = bucket or TokenBucket(tokens_per_minute)
+
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def make_batches(self, texts: List[str]) -> List[tuple]:
+        batches = []
+        start, batch_tokens = 0, 0
+        for idx, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if idx > start and (
+                batch_tokens + tokens > self.max_batch_tokens
+                or idx - start >= self.max_batch_size
+            ):
+                batches.append((start, idx, batch_tokens))
+                start, batch_tokens = idx, 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts), batch_tokens))
+        return batches
+
+    def get_retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            if retry_after is not None:
+                return min(self.max_delay, float(retry_after)) + random.uniform(0, 1)
+        except ValueError:
+            pass
+        # full jitter keeps concurrent batches from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def with_retries(self, func, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.get_retry_delay(e, attempt)
+                self.log.warning(
+                    f"Embedding call failed with {e.__class__.__name__}, "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+
+    def embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        waited = self.bucket.acquire(tokens)
+        with self._lock:
+            self.batches += 1
+            self.throttled_seconds += waited
+        return self.with_retries(self.embeddings.embed_documents, texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.make_batches(texts)
+        if len(batches) == 1:
+            return self.embed_batch(texts, batches[0][2])
+
+        workers = max(1, min(self.max_concurrency, len(batches)))
+        self.log.info(f"Embedding {len(texts)} texts in {len(batches)} batches")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map keeps batch order and re-raises the first failure
+            results = executor.map(
+                lambda batch: self.embed_batch(texts[batch[0] : batch[1]], batch[2]),
+                batches,
+            )
+            return [vector for vectors in results for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        # queries are tiny and latency bound, waiting behind a bulk upload's
+        # budget would stall chat retrieval, a 429 is still retried
+        return self.with_retries(self.embeddings.embed_query, text)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "retries": self.retries,
+                "throttled_seconds": self.throttled_seconds,
+            }
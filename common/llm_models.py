@@ -58,3 +58,7 @@ models = [
         platform='aws',
     ),
 ]
+
+
+def get_model_by_id(llm_model_id: str):
+    return next((model for model in models if model.llm_model_id == llm_model_id), None)
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import List, Optional, Tuple
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """OCR page batches stored on disk by file content hash and OCR version"""
+
+    def __init__(self, cache_dir: str = "./ocr_cache"):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.cache_dir = cache_dir
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_version(*parts) -> str:
+        payload = "\x1f".join(str(part) for part in parts)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def get_path(self, file_hash: str, version: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], f"{file_hash}_{version}.json")
+
+    def get(self, file_hash: str, version: str) -> Optional[List[Tuple[int, int, str]]]:
+        path = self.get_path(file_hash, version)
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                batches = [tuple(batch) for batch in json.load(fp)]
+        except FileNotFoundError:
+            batches = None
+        except (OSError, ValueError):
+            self.log.warning(f"Ignoring unreadable OCR cache entry '{path}'")
+            batches = None
+
+        with self._lock:
+            if batches is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return batches
+
+    def put(self, file_hash: str, version: str, batches: List[Tuple[int, int, str]]):
+        path = self.get_path(file_hash, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write aside and rename so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump([list(batch) for batch in batches], fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,123 @@
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[\w\-]+", re.UNICODE)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from",
+    "has", "have", "how", "i", "in", "is", "it", "its", "me", "my", "of", "on",
+    "or", "tell", "that", "the", "this", "to", "was", "what", "when", "where",
+    "which", "who", "why", "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+class LexicalOverlapReranker:
+    """bm25 over the candidate set plus a bonus for query bigrams found in order"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, bigram_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.bigram_weight = bigram_weight
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        query_tokens = [token for token in tokenize(query) if token not in STOPWORDS]
+        if not query_tokens or not texts:
+            return [0.0] * len(texts)
+
+        docs = [tokenize(text) for text in texts]
+        counts = [Counter(doc) for doc in docs]
+        avg_len = sum(len(doc) for doc in docs) / len(docs) or 1.0
+        terms = set(query_tokens)
+        doc_freq = Counter(token for count in counts for token in terms & count.keys())
+        idf = {
+            token: math.log(
+                1 + (len(docs) - doc_freq[token] + 0.5) / (doc_freq[token] + 0.5)
+            )
+            for token in terms
+        }
+        query_bigrams = set(zip(query_tokens, query_tokens[1:]))
+
+        scores = []
+        for doc, count in zip(docs, counts):
+            norm = self.k1 * (1 - self.b + self.b * len(doc) / avg_len)
+            score = sum(
+                idf[token] * count[token] * (self.k1 + 1) / (count[token] + norm)
+                for token in terms
+                if count[token]
+            )
+            if query_bigrams:
+                doc_bigrams = set(zip(doc, doc[1:]))
+                score += self.bigram_weight * sum(
+                    idf[first] + idf[second]
+                    for first, second in query_bigrams & doc_bigrams
+                )
+            scores.append(score)
+        return scores
+
+
+class OnnxCrossEncoderReranker:
+    """Cross-encoder exported to ONNX, expects model.onnx and tokenizer.json"""
+
+    def __init__(self, model_dir: str, max_length: int = 512, batch_size: int = 16):
+        # optional dependencies, only needed when this reranker is configured
+        # pylint: disable=import-outside-toplevel
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {
+            model_input.name for model_input in self.session.get_inputs()
+        }
+        self.log.info(f"Loaded ONNX cross-encoder from '{model_dir}'")
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        scores = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(
+                [(query, text) for text in texts[start : start + self.batch_size]]
+            )
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array(
+                    [e.attention_mask for e in encodings], dtype=np.int64
+                ),
+                "token_type_ids": np.array(
+                    [e.type_ids for e in encodings], dtype=np.int64
+                ),
+            }
+            logits = self.session.run(
+                None,
+                {
+                    name: value
+                    for name, value in inputs.items()
+                    if name in self.input_names
+                },
+            )[0]
+            scores.extend(logits.reshape(len(encodings), -1)[:, 0].tolist())
+        return scores
+
+
+def create_reranker(kind: Optional[str] = None, model_dir: Optional[str] = None):
+    if not kind or kind == "none":
+        return None
+    if kind == "lexical":
+        return LexicalOverlapReranker()
+    if kind == "onnx":
+        return OnnxCrossEncoderReranker(model_dir)
+    raise ValueError(f"Unknown reranker '{kind}'")
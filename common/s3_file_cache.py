@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from common.aws_fs_helper import AwsS3FsHelper, get_bucket_prefix
+
+MB = 1024 * 1024
+
+
+class S3FileCache:
+    """Downloaded s3 objects on disk, keyed by object path and ETag or version
+
+    Entries are immutable, a changed object gets a new key and the old file
+    ages out. Reads touch the file's mtime, eviction removes the least
+    recently used files once the cache is above max_mb. Files used within
+    min_age_seconds are never evicted, callers get paths and open them later.
+
+    The size total is scanned from disk once and then kept in memory, files
+    written by other processes are counted on the next restart.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "./s3_file_cache",
+        max_mb: int = 10 * 1024,
+        min_age_seconds: float = 300,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * MB
+        self.min_age_seconds = min_age_seconds
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = None
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.downloaded_bytes = 0
+
+    @staticmethod
+    def get_key(bucket: str, prefix: str, head: dict) -> str:
+        # VersionId only exists on versioned buckets, the ETag always does
+        version = head.get("VersionId") or head["ETag"].strip('"')
+        payload = f"{bucket}/{prefix}\x1f{version}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_path(self, key: str, prefix: str) -> str:
+        # loaders pick their parser by extension, keep it on the cached file
+        ext = os.path.splitext(prefix)[-1]
+        return os.path.join(self.cache_dir, key[:2], f"{key}{ext}")
+
+    def get_key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def get_pinned_args(head: dict) -> Optional[dict]:
+        # the GET must return the bytes the key was derived from, s3transfer
+        # accepts VersionId but not IfMatch, unversioned objects are checked
+        # against a second HEAD after the download instead
+        if head.get("VersionId"):
+            return {"VersionId": head["VersionId"]}
+        return None
+
+    def get_file(self, s3_helper: AwsS3FsHelper, s3_path: str, retry=True) -> str:
+        """Local path of the object, downloaded once per ETag"""
+        bucket, prefix = get_bucket_prefix(s3_path)
+        client = s3_helper.s3.meta.client
+        head = client.head_object(Bucket=bucket, Key=prefix)
+        key = self.get_key(bucket, prefix, head)
+        path = self.get_path(key, prefix)
+
+        if self.touch(path):
+            self.record_use(path)
+            with self._lock:
+                self.hits += 1
+            return path
+
+        # concurrent requests for one object share a single download
+        with self.get_key_lock(key):
+            if self.touch(path):
+                self.record_use(path)
+                with self._lock:
+                    self.hits += 1
+                return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            pinned_args = self.get_pinned_args(head)
+            changed = False
+            try:
+                s3_helper.download_to(s3_path, tmp_path, extra_args=pinned_args)
+                if pinned_args is None:
+                    after = client.head_object(Bucket=bucket, Key=prefix)
+                    changed = after["ETag"] != head["ETag"]
+                if not changed:
+                    os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            if changed and not retry:
+                raise RuntimeError(f"'{s3_path}' kept changing while downloading")
+
+            if not changed:
+                self.record_use(path, os.path.getsize(path))
+            with self._lock:
+                if not changed:
+                    self.misses += 1
+                    self.downloaded_bytes += head.get("ContentLength", 0)
+                self._key_locks.pop(key, None)
+
+        if changed:
+            # overwritten between HEAD and GET, key the new version instead
+            self.log.info(f"'{s3_path}' changed while downloading, retrying")
+            return self.get_file(s3_helper, s3_path, retry=False)
+
+        self.log.info(f"Cached '{s3_path}' as '{path}'")
+        self.evict()
+        return path
+
+    @staticmethod
+    def touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def load_entries(self):
+        """Scans the cache once, oldest first, caller holds the lock"""
+        if self._entries is not None:
+            return
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        self._entries = OrderedDict(
+            (path, size) for _, path, size in sorted(entries)
+        )
+        self._total_bytes = sum(self._entries.values())
+
+    def record_use(self, path: str, size: int = None):
+        with self._lock:
+            self.load_entries()
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            elif size is not None:
+                self._entries[path] = size
+                self._total_bytes += size
+
+    def evict(self):
+        cutoff = time.time() - self.min_age_seconds
+        evicted = 0
+        with self._lock:
+            self.load_entries()
+            for path in list(self._entries):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    # another process may have read it recently
+                    if os.stat(path).st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._total_bytes -= self._entries.pop(path)
+                evicted += 1
+            self.evictions += evicted
+            total_bytes = self._total_bytes
+
+        if evicted:
+            self.log.info(
+                f"Evicted {evicted} cached files, {total_bytes / MB:.0f} MB left"
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "downloaded_mb": self.downloaded_bytes / MB,
+                "size_mb": self._total_bytes / MB,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text or "", disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int, model: str) -> List[str]:
+    """Packs whole paragraphs into sections of at most max_tokens"""
+    encoding = get_encoding(model)
+    sections = []
+    current, current_tokens = [], 0
+
+    for paragraph in text.split("\n\n"):
+        tokens = encoding.encode(paragraph, disallowed_special=())
+        if len(tokens) > max_tokens:
+            # a single oversized paragraph is cut on token boundaries
+            if current:
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            for start in range(0, len(tokens), max_tokens):
+                sections.append(encoding.decode(tokens[start : start + max_tokens]))
+            continue
+
+        if current and current_tokens + len(tokens) > max_tokens:
+            sections.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += len(tokens)
+
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
@@ -9,8 +9,20 @@ from langchain_openai import ChatOpenAI
 
 from common.aws_fs_helper import AwsS3FsHelper
 from common.aws_textract import AwsTextract
-from repositories.chroma_db_repo import DocRepository
+from common.reranker import create_reranker
+from common.s3_file_cache import S3FileCache
+from repositories.answer_cache import AnswerCache
+from repositories.chroma_client_pool import ChromaClientPool, get_collection_suffix
+from repositories.chroma_db_repo import (
+    EMBEDDING_DIMENSIONS,
+    DocRepository,
+    get_openai_embeddings,
+)
 from repositories.database_repo import UsersDBRepo
+from repositories.document_text_store import DocumentTextStore
+from repositories.ingestion_job_repo import IngestionJobRepository
+from repositories.lexical_index import LexicalIndex
+from repositories.prompt_registry import PromptRegistry
 from repositories.document_qa_repo import DocumentQADBRepository
 from services.databases import Database
 
@@ -19,6 +31,20 @@ DEFAULT_CONFIG = os.path.join(FILE_DIR, "./configs/config.yml")
 LOGGING_FILE = os.path.join(FILE_DIR, "./configs/logging.ini")
 
 
+def create_qa_agent(**kwargs):
+    # pylint: disable=import-outside-toplevel
+    from commands.document_qa_chat import AdvancedDocumentQAAgent
+
+    return AdvancedDocumentQAAgent(**kwargs)
+
+
+def create_grader(**kwargs):
+    # pylint: disable=import-outside-toplevel
+    from agents.grader_agent import GraderNode
+
+    return GraderNode(**kwargs)
+
+
 class Container(containers.DeclarativeContainer):
     config = providers.Configuration(yaml_files=[DEFAULT_CONFIG])
 
@@ -60,8 +86,65 @@ class Container(containers.DeclarativeContainer):
 
     openai_client = providers.ThreadLocalSingleton(openai.OpenAI)
 
+    chroma_pool = providers.Singleton(
+        ChromaClientPool,
+        embedding_function=providers.Callable(
+            get_openai_embeddings,
+            dimensions=config.vector_storage.dimensions,
+            tokens_per_minute=config.embeddings.tokens_per_minute,
+            rate_limit_url=config.embeddings.rate_limit_url,
+            processes=config.embeddings.processes,
+        ),
+        persist_directory="./chroma_db",
+        collection_suffix=providers.Callable(
+            get_collection_suffix,
+            dimensions=config.vector_storage.dimensions,
+            full_dimensions=EMBEDDING_DIMENSIONS,
+        ),
+        host=config.chroma.host,
+        port=config.chroma.port,
+    )
+
+    prompt_registry = providers.Singleton(
+        PromptRegistry,
+        session_factory=db_session.provided.session,
+        ttl_seconds=config.prompts.ttl_seconds,
+    )
+
+    answer_cache = providers.Singleton(
+        AnswerCache,
+        max_items=config.answer_cache.max_items,
+        ttl_seconds=config.answer_cache.ttl_seconds,
+        marker_dir="./answer_cache",
+        embeddings=chroma_pool.provided.embedding_function,
+        similarity_threshold=config.answer_cache.similarity_threshold,
+    )
+
+    s3_file_cache = providers.Singleton(
+        S3FileCache,
+        cache_dir="./s3_file_cache",
+        max_mb=config.s3_file_cache.max_mb,
+    )
+
+    document_text_store = providers.Singleton(
+        DocumentTextStore, base_dir="./document_text"
+    )
+
+    lexical_index = providers.Singleton(LexicalIndex, base_dir="./lexical_index")
+
+    reranker = providers.Singleton(
+        create_reranker,
+        kind=config.retrieval.reranker,
+        model_dir=config.retrieval.reranker_model_dir,
+    )
+
     doc_repo = providers.ThreadLocalSingleton(
-        DocRepository, session_factory=db_session.provided.session
+        DocRepository,
+        session_factory=db_session.provided.session,
+        chroma_pool=chroma_pool,
+        prompt_registry=prompt_registry,
+        text_store=document_text_store,
+        lexical_index=lexical_index,
     )
 
     user_repo = providers.ThreadLocalSingleton(
@@ -72,6 +155,10 @@ class Container(containers.DeclarativeContainer):
         DocumentQADBRepository, session_factory=db_session.provided.session
     )
 
+    ingestion_job_repo = providers.ThreadLocalSingleton(
+        IngestionJobRepository, session_factory=db_session.provided.session
+    )
+
     gpt_4o_mini_chat_llm = providers.ThreadLocalSingleton(
         ChatOpenAI(model="gpt-4o-mini", temperature=0)
     )
@@ -80,3 +167,23 @@ class Container(containers.DeclarativeContainer):
 
     aws_text_tract = providers.ThreadLocalSingleton(AwsTextract, client=textract_client)
 
+    qa_agent = providers.Singleton(
+        create_qa_agent,
+        db=doc_repo,
+        chroma_pool=chroma_pool,
+        lexical_index=lexical_index,
+        lexical_k=config.retrieval.lexical_k,
+        reranker=reranker,
+        rerank_candidates=config.retrieval.rerank_candidates,
+        context_token_budget=config.retrieval.context_token_budget,
+        max_document_tokens=config.whole_document.max_document_tokens,
+        section_tokens=config.whole_document.section_tokens,
+        response_reserve_tokens=config.whole_document.response_reserve_tokens,
+        map_concurrency=config.whole_document.map_concurrency,
+    )
+
+    grader = providers.Singleton(
+        create_grader,
+        db=doc_repo,
+    )
+
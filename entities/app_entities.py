@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class LLMModel(BaseModel):
+    name: str
+    llm_model_id: str
+    llm_model_type: str
+    context_window: int
+    max_tokens: int
+    platform: str
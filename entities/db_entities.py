@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table, VARCHAR, Text
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table, VARCHAR, Text, Index
 from sqlalchemy.orm import relationship
 
 from services import databases
@@ -18,12 +18,13 @@ class DocumentOperation(databases.Base):
     __tablename__ = "document_operations"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    doc_id = Column(Integer)
-    index_id = Column(VARCHAR(10))
+    doc_id = Column(Integer, index=True)
+    index_id = Column(VARCHAR(10), index=True)
     index_name = Column(Text)
     operation = Column(Text)
     file_type = Column(Text)
     source_path = Column(Text)
+    # chunk ids live in document_chunks, only rows written before that use this
     db_gen_id = Column(Text)
     created = Column(DateTime, default=datetime.now(timezone.utc))
 
@@ -42,6 +43,57 @@ class DocumentOperation(databases.Base):
         return f'DocumentOperation({",".join(fields)})'
 
 
+class DocumentChunk(databases.Base):
+    __tablename__ = "document_chunks"
+    __table_args__ = (
+        Index("ix_document_chunks_index_doc", "index_id", "doc_id", "ordinal"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    doc_id = Column(Integer, nullable=False)
+    index_id = Column(VARCHAR(10), nullable=False)
+    chroma_id = Column(String(64), index=True, nullable=False)
+    chunk_hash = Column(String(64))
+    ordinal = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        fields = [
+            f"id={self.id}",
+            f"doc_id={self.doc_id}",
+            f"index_id={self.index_id}",
+            f"chroma_id={self.chroma_id}",
+            f"chunk_hash={self.chunk_hash}",
+            f"ordinal={self.ordinal}",
+        ]
+        return f'DocumentChunk({",".join(fields)})'
+
+
+class IngestionJobFile(databases.Base):
+    __tablename__ = "ingestion_job_files"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(36), index=True, nullable=False)
+    index_id = Column(VARCHAR(10))
+    file_id = Column(Integer)
+    file_path = Column(Text)
+    status = Column(String(20), nullable=False)
+    message = Column(Text)
+    created = Column(DateTime, nullable=False, default=func.now())
+    updated = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        fields = [
+            f"id={self.id}",
+            f"job_id={self.job_id}",
+            f"index_id={self.index_id}",
+            f"file_id={self.file_id}",
+            f"file_path={self.file_path}",
+            f"status={self.status}",
+            f"message={self.message}",
+        ]
+        return f'IngestionJobFile({",".join(fields)})'
+
+
 # Projects Table
 class Projects(databases.Base):
     __tablename__ = "projects"
@@ -89,7 +141,7 @@ class Prompts(databases.Base):
     __tablename__ = "prompts"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    prompt_name = Column(Text)
+    prompt_name = Column(String(255), index=True)
     prompt = Column(Text)
 
     def __repr__(self):
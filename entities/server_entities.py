@@ -14,6 +14,7 @@ class KnowledgeStore(BaseModel):
     name: str
     type: str
     documentIds: List[int]
+    partial: bool = False
     model_config = ConfigDict(from_attributes=True, extra="ignore")
 
 class QueryRequest(BaseModel):
@@ -33,6 +34,26 @@ class DocumentInput(BaseModel):
     operation: str
     type: str
     data: Optional[List[FileData]] = None
+    concurrency: Optional[int] = None
+
+class FileUploadStatus(BaseModel):
+    fileId: int
+    success: bool
+    message: Optional[str] = None
+
+
+class IngestionFileStatus(BaseModel):
+    fileId: int
+    filePath: str
+    status: str
+    message: Optional[str] = None
+    updated: Optional[datetime] = None
+
+class IngestionJob(BaseModel):
+    jobId: str
+    indexId: str
+    status: str
+    files: List[IngestionFileStatus]
 
 
 class ResponseHeader(BaseModel):
@@ -60,7 +81,7 @@ class DocumentOperation(BaseModel):
     operation: str
     file_type: str
     source_path: str
-    db_gen_id: str
+    db_gen_id: Optional[str] = None
     created: datetime
 
     model_config = ConfigDict(from_attributes=True, extra="ignore")
@@ -169,7 +169,7 @@ st.markdown("""
 
 
 # API functions with session handling
-def api_request(method, endpoint, data=None, files=None, params=None):
+def api_request(method, endpoint, data=None, files=None, params=None, stream=False):
     """Make an API request with authentication handling"""
     if not st.session_state.user_id:
         st.session_state.current_page = "login"
@@ -192,7 +192,7 @@ def api_request(method, endpoint, data=None, files=None, params=None):
                 headers.pop("Content-Type", None)
                 response = requests.post(url, headers=headers, data=data, files=files)
             else:
-                response = requests.post(url, headers=headers, json=data)
+                response = requests.post(url, headers=headers, json=data, stream=stream)
         elif method == "DELETE":
             response = requests.delete(url, headers=headers)
         else:
@@ -311,7 +311,26 @@ def upload_document(file, index_id=None, name=None, doc_type=None, operation=Non
         return False, f"Error uploading document: {str(e)}"
 
 
-def send_chat_message(question, knowledge_store_id):
+def read_chat_stream(response, placeholder=None):
+    """Render streamed answer tokens and return the final response payload"""
+    answer = ""
+    response_data = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        event = json.loads(line)
+        if event["event"] == "token":
+            answer += event["data"]
+            if placeholder:
+                placeholder.markdown(f"<div class='bot-message'>{answer}</div>", unsafe_allow_html=True)
+        elif event["event"] == "final":
+            response_data = event["data"]
+        elif event["event"] == "error":
+            raise RuntimeError(event["data"])
+    return response_data
+
+
+def send_chat_message(question, knowledge_store_id, placeholder=None):
     """Send chat message to API"""
     try:
         # Prepare knowledge store
@@ -344,10 +363,12 @@ def send_chat_message(question, knowledge_store_id):
         }
 
         # Make API call
-        response = api_request("POST", "/document/doc_chat", data=query_request)
+        response = api_request("POST", "/document/doc_chat/stream", data=query_request, stream=True)
 
         if response and response.status_code == 200:
-            response_data = response.json()
+            response_data = read_chat_stream(response, placeholder)
+            if response_data is None:
+                return False, "Chat stream ended without an answer", None
             # Add to history
             new_entry = {
                 "id": len(st.session_state.chat_history),
@@ -595,10 +616,12 @@ def render_chat_page():
     with col2:
         if st.button("Send", use_container_width=True):
             if user_input:
+                answer_placeholder = st.empty()
                 with st.spinner("Getting answer..."):
                     success, message, response_data = send_chat_message(
                         user_input,
-                        st.session_state.selected_knowledge_store.get('id')
+                        st.session_state.selected_knowledge_store.get('id'),
+                        answer_placeholder
                     )
 
                     if success:
@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import List, Optional
 
 import typer
 from dotenv import load_dotenv
@@ -22,10 +23,75 @@ def create_db():
     cmds("create-db")
 
 
+@app.command("create-indexes")
+def create_indexes():
+    cmds = DbCmds()
+    cmds("create-indexes")
+
+
+@app.command("build-lexical-index")
+def build_lexical_index(index_ids: List[str]):
+    # pylint: disable=import-outside-toplevel
+    from commands.document_service import DocumentService
+
+    service = DocumentService()
+    for index_id in index_ids:
+        count = service.rebuild_lexical_index(index_id)
+        typer.echo(f"{index_id}: {count} chunks indexed")
+
+
+@app.command("benchmark-vectors")
+def benchmark_vectors(
+    index_id: str,
+    dimensions: str = "256,512,1024",
+    k: int = 10,
+    num_queries: int = 200,
+    rescore_factor: int = 4,
+):
+    # pylint: disable=import-outside-toplevel
+    from commands.vector_benchmark import VectorBenchmark
+
+    rows = VectorBenchmark()(
+        index_id,
+        [int(dims) for dims in dimensions.split(",")],
+        k=k,
+        num_queries=num_queries,
+        rescore_factor=rescore_factor,
+    )
+    typer.echo(f"{'dims':>6} {'precision':>9} {'rescored':>8} {'bytes':>6} recall@{k}")
+    for row in rows:
+        typer.echo(
+            f"{row['dimensions']:>6} {row['precision']:>9} {str(row['rescored']):>8} "
+            f"{row['bytes_per_vector']:>6} {row['recall']:.3f}"
+        )
+
+
+@app.command("benchmark-s3-download")
+def benchmark_s3_download(
+    s3_path: str,
+    repeat: int = 3,
+    modes: str = "stream-8k,stream-8mb,parallel,memory",
+    endpoint_url: Optional[str] = None,
+):
+    # pylint: disable=import-outside-toplevel
+    from commands.s3_benchmark import S3DownloadBenchmark
+
+    rows = S3DownloadBenchmark()(
+        s3_path, repeat=repeat, modes=modes.split(","), endpoint_url=endpoint_url
+    )
+    typer.echo(f"{'mode':>10} {'MB':>8} {'seconds':>8} {'cpu':>8} {'MB/s':>8}")
+    for row in rows:
+        typer.echo(
+            f"{row['mode']:>10} {row['size_mb']:>8.1f} {row['seconds']:>8.2f} "
+            f"{row['cpu_seconds']:>8.2f} {row['mb_per_second']:>8.1f}"
+        )
+
+
 @app.command("worker")
 def run_worker(log_level: str = "DEBUG"):
     # pylint: disable=import-outside-toplevel,unused-import
-    from celery_app import celery_app
+    from celery_app import celery_app, INGESTION_QUEUE
+    from commands.document_service import IngestionJobService
 
     celery_app.conf.beat_schedule = {
         "check-form-filling-message-1-min": {
@@ -36,11 +102,14 @@ def run_worker(log_level: str = "DEBUG"):
         },
     }
 
+    queues = ["celery", "insight-form-filling-tasks-queue"]
+    if IngestionJobService().is_available():
+        queues.append(INGESTION_QUEUE)
+    else:
+        logging.warning("chroma.host is not set, not consuming ingestion jobs")
+
     worker = celery_app.Worker(
-        queues=[
-            "celery",
-            "insight-form-filling-tasks-queue",
-        ],
+        queues=queues,
         loglevel=log_level,
         concurrency=8,
         beat=True,
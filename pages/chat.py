@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 from typing import List, Optional
@@ -38,7 +40,7 @@ def add_to_chat_history(question: str, answer: str):
     )
     st.session_state.chat_history.append(chat_entry)
 
-def send_chat_request(question: str) -> Optional[str]:
+def send_chat_request(question: str, placeholder=None) -> Optional[str]:
     try:
         # Create knowledge store from user's documents
         knowledge_store = KnowledgeStore(
@@ -56,12 +58,27 @@ def send_chat_request(question: str) -> Optional[str]:
         )
         
         response = requests.post(
-            f"{API_BASE_URL}/document/doc_chat",
-            json=query_request.dict()
+            f"{API_BASE_URL}/document/doc_chat/stream",
+            json=query_request.dict(),
+            stream=True
         )
         
         if response.status_code == 200:
-            return response.json().get("answer", "No answer received")
+            answer = ""
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "token":
+                    answer += event["data"]
+                    if placeholder:
+                        placeholder.markdown(answer)
+                elif event["event"] == "final":
+                    answer = event["data"].get("answer", "No answer received")
+                elif event["event"] == "error":
+                    st.error(f"Error: {event['data']}")
+                    return None
+            return answer or "No answer received"
         else:
             st.error(f"Error: {response.status_code}")
             return None
@@ -104,10 +121,11 @@ def main():
         
         # Get and display assistant response
         with st.chat_message("assistant"):
+            answer_placeholder = st.empty()
             with st.spinner("Thinking..."):
-                response = send_chat_request(prompt)
+                response = send_chat_request(prompt, answer_placeholder)
                 if response:
-                    st.write(response)
+                    answer_placeholder.write(response)
                     add_to_chat_history(prompt, response)
                 else:
                     st.error("Failed to get response from the server")
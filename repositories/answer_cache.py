@@ -0,0 +1,174 @@
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from common.embedding_cache import normalize_text
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"[\s?.!]+$", "", normalize_text(question).lower())
+
+
+class AnswerCache:
+    """Graded chat answers per collection, document filter and question
+
+    Invalidation touches a marker file per collection, so ingestion running in
+    a celery worker also expires the entries held by the api processes.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 2000,
+        ttl_seconds: float = 3600,
+        marker_dir: str = "./answer_cache",
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: Optional[float] = None,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.marker_dir = marker_dir
+        self.embeddings = embeddings if similarity_threshold else None
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def get_key(collection: str, document_ids: Optional[List[int]], question: str):
+        return (
+            str(collection),
+            tuple(sorted(document_ids or [])),
+            normalize_question(question),
+        )
+
+    def get_marker_path(self, collection: str) -> str:
+        return os.path.join(self.marker_dir, f"{collection}.gen")
+
+    def get_generation(self, collection: str) -> int:
+        try:
+            return os.stat(self.get_marker_path(collection)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def is_fresh(self, entry, generation: int) -> bool:
+        return (
+            time.monotonic() - entry["created_at"] < self.ttl_seconds
+            and entry["generation"] == generation
+        )
+
+    def get(
+        self, collection: str, document_ids: Optional[List[int]], question: str
+    ) -> Optional[dict]:
+        key = self.get_key(collection, document_ids, question)
+        generation = self.get_generation(key[0])
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.is_fresh(entry, generation):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"]
+            if entry is not None:
+                del self._entries[key]
+
+        value = self.get_similar(key, question, generation)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.similar_hits += 1
+        return value
+
+    def get_similar(self, key, question: str, generation: int) -> Optional[dict]:
+        if self.embeddings is None:
+            return None
+        with self._lock:
+            candidates = [
+                entry
+                for entry_key, entry in self._entries.items()
+                if entry_key[:2] == key[:2]
+                and entry["vector"] is not None
+                and self.is_fresh(entry, generation)
+            ]
+        if not candidates:
+            return None
+
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        matrix = np.stack([entry["vector"] for entry in candidates])
+        scores = matrix @ vector / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector) + 1e-12
+        )
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        self.log.info(f"Similar cached answer found with score {scores[best]:.3f}")
+        return candidates[best]["value"]
+
+    def put(
+        self,
+        collection: str,
+        document_ids: Optional[List[int]],
+        question: str,
+        value: dict,
+        generation: Optional[int] = None,
+    ):
+        key = self.get_key(collection, document_ids, question)
+        vector = None
+        if self.embeddings is not None:
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+
+        # callers pass the generation read before computing the answer, so an
+        # invalidation that raced with it is not hidden behind a fresh entry
+        entry = {
+            "value": value,
+            "vector": vector,
+            "created_at": time.monotonic(),
+            "generation": (
+                self.get_generation(key[0]) if generation is None else generation
+            ),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection: str):
+        collection = str(collection)
+        os.makedirs(self.marker_dir, exist_ok=True)
+        with open(self.get_marker_path(collection), "w", encoding="utf-8") as fp:
+            fp.write(uuid.uuid4().hex)
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == collection]:
+                del self._entries[key]
+            self.invalidations += 1
+        self.log.info(f"Invalidated cached answers of '{collection}'")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "items": len(self._entries),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": (
+                    (self.hits + self.similar_hits) / lookups if lookups else 0.0
+                ),
+            }
@@ -0,0 +1,129 @@
+import logging
+import threading
+from typing import Optional
+
+import chromadb
+from chromadb.config import Settings
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+
+def get_collection_suffix(dimensions: int, full_dimensions: int) -> str:
+    return "" if dimensions == full_dimensions else f"__d{dimensions}"
+
+
+class ChromaClientPool:
+    """Process wide chroma client with cached collection handles
+
+    Callers use the index id, the pool maps it to the collection of the
+    configured storage profile. Without a host chroma runs embedded on
+    persist_directory, which only one process may write to. Processes that
+    share collections (the api and the ingestion workers) need a chroma server.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_directory: str = "./chroma_db",
+        collection_suffix: str = "",
+        host: Optional[str] = None,
+        port: int = 8000,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.collection_suffix = collection_suffix
+        self.host = host
+        self.port = port
+
+        self._client = None
+        self._vector_stores = {}
+        self._lock = threading.RLock()
+
+        self.opens = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if self.is_shared:
+                        self._client = chromadb.HttpClient(
+                            host=self.host,
+                            port=self.port,
+                            settings=Settings(anonymized_telemetry=False),
+                        )
+                        location = f"{self.host}:{self.port}"
+                    else:
+                        self._client = chromadb.PersistentClient(
+                            self.persist_directory
+                        )
+                        location = self.persist_directory
+                    self.opens += 1
+                    self.log.info(f"Opened chroma client at '{location}'")
+        return self._client
+
+    @property
+    def is_shared(self) -> bool:
+        """True when collections live on a chroma server other processes can use"""
+        return bool(self.host)
+
+    def get_storage_name(self, collection_name: str) -> str:
+        return f"{collection_name}{self.collection_suffix}"
+
+    def get_vector_store(self, collection_name: str) -> Chroma:
+        with self._lock:
+            vector_store = self._vector_stores.get(collection_name)
+            if vector_store is not None:
+                self.hits += 1
+                return vector_store
+
+            self.misses += 1
+            vector_store = Chroma(
+                client=self.client,
+                collection_name=self.get_storage_name(collection_name),
+                embedding_function=self.embedding_function,
+            )
+            self._vector_stores[collection_name] = vector_store
+            return vector_store
+
+    def get_collection(self, collection_name: str):
+        # pylint: disable=protected-access
+        return self.get_vector_store(collection_name)._collection
+
+    def find_collection(self, collection_name: str):
+        """Existing collection or None, unlike get_collection it never creates one"""
+        with self._lock:
+            vector_store = self._vector_stores.get(collection_name)
+        if vector_store is not None:
+            # pylint: disable=protected-access
+            return vector_store._collection
+        try:
+            return self.client.get_collection(self.get_storage_name(collection_name))
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    def invalidate(self, collection_name: str):
+        with self._lock:
+            if self._vector_stores.pop(collection_name, None) is not None:
+                self.invalidations += 1
+                self.log.info(f"Invalidated cached collection '{collection_name}'")
+
+    def delete_collection(self, collection_name: str):
+        try:
+            self.client.delete_collection(self.get_storage_name(collection_name))
+        finally:
+            self.invalidate(collection_name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "opens": self.opens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "cached_collections": len(self._vector_stores),
+            }
@@ -1,23 +1,88 @@
+import hashlib
+import json
 import logging
 import os
 import traceback
+import uuid
+from functools import lru_cache
 from contextlib import AbstractContextManager
-from typing import Callable, List
+from typing import Callable, List, Optional
 
-import chromadb
-from chromadb import Settings
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from sqlalchemy.orm import Session
 
-from entities import db_entities, server_entities
+from common.embedding_cache import CachedEmbeddings
+from common.embedding_executor import BatchedEmbeddings, RedisTokenBucket, TokenBucket
+from entities import db_entities
+from repositories.chroma_client_pool import ChromaClientPool
+from repositories.document_text_store import DocumentTextStore
+from repositories.lexical_index import LexicalIndex
+from repositories.prompt_registry import PromptRegistry
 
 load_dotenv(".env")
 
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = 3072
+DELETE_PAGE_SIZE = 1000
+INGEST_PAGE_SIZE = 500
+
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
 llama_embeddings = OllamaEmbeddings(model="llama3.2")
-openai_embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=3072)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_token_bucket(
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    rate_limit_url: Optional[str] = None,
+    processes: int = 1,
+):
+    """The account's embedding budget, shared through redis when a url is set"""
+    if rate_limit_url:
+        return RedisTokenBucket(
+            tokens_per_minute, rate_limit_url, key=f"embedding-tokens:{EMBEDDING_MODEL}"
+        )
+    # without redis every process that embeds gets an equal share
+    return TokenBucket(max(1, tokens_per_minute // max(1, processes)))
+
+
+@lru_cache(maxsize=None)
+def get_openai_embeddings(
+    dimensions: int = EMBEDDING_DIMENSIONS,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    rate_limit_url: Optional[str] = None,
+    processes: int = 1,
+) -> CachedEmbeddings:
+    """text-embedding-3 is matryoshka trained, smaller dimensions are native"""
+    # retries and batching are owned by the executor, not the openai client
+    return CachedEmbeddings(
+        BatchedEmbeddings(
+            OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=dimensions, max_retries=0),
+            model=EMBEDDING_MODEL,
+            bucket=get_embedding_token_bucket(
+                tokens_per_minute, rate_limit_url, processes
+            ),
+        ),
+        model=EMBEDDING_MODEL,
+        dimensions=dimensions,
+    )
+
+
+openai_embeddings = get_openai_embeddings(EMBEDDING_DIMENSIONS)
+
+
+def get_chunk_hash(text: str, metadata: dict) -> str:
+    metadata = {key: value for key, value in metadata.items() if key != "chunk_hash"}
+    payload = json.dumps([text, metadata], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_chunk_id(index_id: str, doc_id: int, ordinal: int, chunk_hash: str) -> str:
+    # the same chunk always gets the same id, so retried ingests upsert in place
+    payload = f"{index_id}:{doc_id}:{ordinal}:{chunk_hash}".encode("utf-8")
+    return str(uuid.UUID(bytes=hashlib.sha256(payload).digest()[:16]))
 
 
 def sanitize_index_id(index_id: str) -> str:
@@ -30,47 +95,31 @@ class DocRepository:
     def __init__(
         self,
         session_factory: Callable[..., AbstractContextManager[Session]],
-        persist_directory: str = "./chroma_db",
+        chroma_pool: ChromaClientPool,
+        prompt_registry: PromptRegistry,
+        text_store: DocumentTextStore,
+        lexical_index: LexicalIndex,
     ):
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.session_factory = session_factory
-        self.persist_directory = persist_directory
-
-        self.chroma_client = chromadb.PersistentClient(self.persist_directory)
+        self.chroma_pool = chroma_pool
+        self.prompt_registry = prompt_registry
+        self.text_store = text_store
+        self.lexical_index = lexical_index
 
-        # .HttpClient(
-        #     host="10.142.152.101",
-        #     port=8000,
-        #     ssl=False,
-        #     settings=Settings(allow_reset=True, anonymized_telemetry=False),
-        # ))
+    @property
+    def chroma_client(self):
+        return self.chroma_pool.client
 
     def get_or_create_collection(self, index_name: str):
-        try:
-            vector_store = Chroma(
-                collection_name=index_name,
-                embedding_function=openai_embeddings,
-                persist_directory=self.persist_directory,
-                client=self.chroma_client,
-            )
-
-            self.log.info(f"Using existing collection '{index_name}'")
-            return vector_store
-
-        except Exception as e:
-            self.log.info(f"Creating new collection '{index_name}'")
-            vector_store = Chroma.from_documents(
-                documents=[],
-                embedding=openai_embeddings,
-                persist_directory=self.persist_directory,
-                collection_name=index_name,
-                client=self.chroma_client,
-            )
-            return vector_store
+        self.log.info(f"Using collection '{index_name}'")
+        return self.chroma_pool.get_vector_store(index_name)
 
     def get_all_docs(self, index_name: str):
         try:
-            collection = self.chroma_client.get_collection(index_name)
+            collection = self.chroma_pool.find_collection(index_name)
+            if collection is None:
+                return []
             results = collection.get()
             documents = [
                 {"id": doc_id, "text": doc_text, "metadata": meta}
@@ -94,13 +143,38 @@ class DocRepository:
         operation: str,
         file_type: str,
         doc_chunks: List,
-    ):
-        vector_store = self.get_or_create_collection(index_id)
-        db_id_lst = vector_store.add_documents(doc_chunks)
-
-        db_id_lst = ",".join(db_id_lst)
+    ) -> List[str]:
+        chunk_hashes = [
+            get_chunk_hash(chunk.page_content, chunk.metadata) for chunk in doc_chunks
+        ]
+        chunk_ids = [
+            get_chunk_id(index_id, doc_id, ordinal, chunk_hash)
+            for ordinal, chunk_hash in enumerate(chunk_hashes)
+        ]
+        is_update = operation.lower() == "update"
+        # an add of a document that is already stored is diffed like an update,
+        # re-running a finished ingest then embeds and writes nothing, and the
+        # chunks of legacy rows are replaced instead of orphaned
+        stored_chunks = self.get_stored_chunks(index_id, doc_id)
+        vanished_ids = []
+        if stored_chunks or is_update:
+            chunk_ids, vanished_ids = self.update_chunks(
+                index_id, doc_id, doc_chunks, chunk_ids, chunk_hashes, stored_chunks
+            )
+        else:
+            self.add_chunks(index_id, doc_chunks, chunk_ids, chunk_hashes)
+        self.log.info(
+            f"Embedding cache stats: {self.chroma_pool.embedding_function.stats()}"
+        )
 
         with self.session_factory() as session:
+            # the new rows list every live chunk, older rows would duplicate them
+            self.get_document_query(
+                session, db_entities.DocumentOperation, index_id, doc_id
+            ).delete(synchronize_session=False)
+            self.get_document_query(
+                session, db_entities.DocumentChunk, index_id, doc_id
+            ).delete(synchronize_session=False)
             document = db_entities.DocumentOperation(
                 doc_id=doc_id,
                 index_id=index_id,
@@ -108,51 +182,296 @@ class DocRepository:
                 operation=operation,
                 file_type=file_type,
                 source_path=s3_path,
-                db_gen_id=db_id_lst,
             )
             session.add(document)
+            session.bulk_insert_mappings(
+                db_entities.DocumentChunk,
+                [
+                    {
+                        "doc_id": doc_id,
+                        "index_id": index_id,
+                        "chroma_id": chunk_id,
+                        "chunk_hash": chunk_hash,
+                        "ordinal": ordinal,
+                    }
+                    for ordinal, (chunk_id, chunk_hash) in enumerate(
+                        zip(chunk_ids, chunk_hashes)
+                    )
+                ],
+            )
             session.commit()
-            session.refresh(document)
 
             self.log.info(
                 f"Document '{os.path.basename(document.source_path)}' uploaded to '{index_id}' collection and database."
             )
-            uploaded_data = server_entities.DocumentOperation.model_validate(document)
 
-        return uploaded_data.db_gen_id
+        # dropped only once the new chunk list is committed
+        self.delete_chunks(index_id, vanished_ids)
+        return chunk_ids
+
+    @staticmethod
+    def get_document_query(session: Session, entity, index_id: str, doc_id: int):
+        return session.query(entity).filter(
+            entity.index_id == index_id, entity.doc_id == doc_id
+        )
+
+    def get_existing_ids(self, collection, ids: List[str]) -> set:
+        batch_size = self.chroma_client.get_max_batch_size()
+        existing = set()
+        for start in range(0, len(ids), batch_size):
+            result = collection.get(ids=ids[start : start + batch_size], include=[])
+            existing.update(result["ids"])
+        return existing
+
+    def add_chunks(
+        self,
+        index_id: str,
+        doc_chunks: List,
+        ids: List[str],
+        chunk_hashes: List[str],
+    ):
+        """Embeds and upserts the chunks whose ids are not in the collection yet
+
+        Pages are written as soon as they are embedded and nothing is rolled
+        back on failure, a retry with the same ids resumes after the last page.
+        """
+        vector_store = self.get_or_create_collection(index_id)
+        collection = self.chroma_pool.get_collection(index_id)
+        existing = self.get_existing_ids(collection, ids)
+        pending = [idx for idx, chunk_id in enumerate(ids) if chunk_id not in existing]
+        if existing:
+            self.log.info(
+                f"Resuming ingest into '{index_id}': {len(existing)} chunks "
+                f"already stored, {len(pending)} left"
+            )
+
+        page_size = min(INGEST_PAGE_SIZE, self.chroma_client.get_max_batch_size())
+        for start in range(0, len(pending), page_size):
+            page = pending[start : start + page_size]
+            page_ids = [ids[idx] for idx in page]
+            texts = [doc_chunks[idx].page_content for idx in page]
+            metadatas = [
+                {**doc_chunks[idx].metadata, "chunk_hash": chunk_hashes[idx]}
+                for idx in page
+            ]
+            embeddings = vector_store.embeddings.embed_documents(texts)
+            # lexical first, chroma is what a resumed ingest checks for
+            self.lexical_index.add(index_id, page_ids, texts, metadatas)
+            try:
+                collection.upsert(
+                    ids=page_ids,
+                    documents=texts,
+                    metadatas=metadatas,
+                    embeddings=embeddings,
+                )
+            except Exception:
+                self.log.error(
+                    f"Vector write to '{index_id}' failed after "
+                    f"{start} of {len(pending)} chunks"
+                )
+                self.lexical_index.delete(index_id, page_ids)
+                raise
+
+    def get_stored_chunks(self, index_id: str, doc_id: int) -> List[tuple]:
+        """(chroma_id, chunk_hash) of every chunk of the document in the collection"""
+        collection = self.chroma_pool.find_collection(index_id)
+        if collection is None:
+            return []
 
-    def delete_by_id(self, doc_id: int, index_id: str):
-        collection = self.chroma_client.get_or_create_collection(index_id)
         with self.session_factory() as session:
-            document = (
-                session.query(db_entities.DocumentOperation)
-                .filter(db_entities.DocumentOperation.doc_id == doc_id)
-                .first()
+            rows = (
+                self.get_document_query(
+                    session, db_entities.DocumentChunk, index_id, doc_id
+                )
+                .with_entities(
+                    db_entities.DocumentChunk.chroma_id,
+                    db_entities.DocumentChunk.chunk_hash,
+                )
+                .order_by(db_entities.DocumentChunk.ordinal)
+                .all()
+            )
+        if rows:
+            # rows do not record the storage profile, after a dimensions change
+            # or a lost collection their ids are missing and must be written
+            existing = self.get_existing_ids(
+                collection, [chroma_id for chroma_id, _ in rows]
             )
+            return [
+                (chroma_id, chunk_hash)
+                for chroma_id, chunk_hash in rows
+                if chroma_id in existing
+            ]
 
-            if document:
-                db_gen_id_lst = document.db_gen_id.split(",")
-                collection.delete(ids=db_gen_id_lst)
+        # documents ingested before document_chunks existed, or whose ingest
+        # failed before its rows were written, are read from chroma
+        stored_chunks = []
+        while True:
+            page = collection.get(
+                where={"doc_id": doc_id},
+                include=["documents", "metadatas"],
+                limit=DELETE_PAGE_SIZE,
+                offset=len(stored_chunks),
+            )
+            stored_chunks.extend(
+                (chunk_id, metadata.get("chunk_hash") or get_chunk_hash(text, metadata))
+                for chunk_id, text, metadata in zip(
+                    page["ids"], page["documents"], page["metadatas"]
+                )
+            )
+            if len(page["ids"]) < DELETE_PAGE_SIZE:
+                break
+        return stored_chunks
 
-                session.query(db_entities.DocumentOperation).filter(
-                    db_entities.DocumentOperation.doc_id == doc_id
-                ).delete(synchronize_session="fetch")
-                session.commit()
+    def update_chunks(
+        self,
+        index_id: str,
+        doc_id: int,
+        doc_chunks: List,
+        chunk_ids: List[str],
+        chunk_hashes: List[str],
+        stored_chunks: List[tuple],
+    ):
+        """Embeds only new chunks, returns the chunk ids in order and the vanished ids"""
+        stored_ids = {chunk_id for chunk_id, _ in stored_chunks}
+        ids = [chunk_id if chunk_id in stored_ids else None for chunk_id in chunk_ids]
+
+        # chunks that only moved keep their stored id
+        existing_ids = {}
+        kept = {chunk_id for chunk_id in ids if chunk_id}
+        for chunk_id, chunk_hash in stored_chunks:
+            if chunk_id not in kept:
+                existing_ids.setdefault(chunk_hash, []).append(chunk_id)
+
+        new_positions = []
+        for position, chunk_hash in enumerate(chunk_hashes):
+            if ids[position]:
+                continue
+            same_ids = existing_ids.get(chunk_hash)
+            if same_ids:
+                ids[position] = same_ids.pop()
+            else:
+                ids[position] = chunk_ids[position]
+                new_positions.append(position)
+
+        if new_positions:
+            self.add_chunks(
+                index_id,
+                [doc_chunks[position] for position in new_positions],
+                [chunk_ids[position] for position in new_positions],
+                [chunk_hashes[position] for position in new_positions],
+            )
 
-                self.log.info(
-                    f"Document '{os.path.basename(document.source_path)}' deleted from '{index_id}' collection and database."
+        # leftovers include duplicates written by updates before this diffing
+        vanished_ids = [
+            chunk_id for same_ids in existing_ids.values() for chunk_id in same_ids
+        ]
+        self.log.info(
+            f"Update of document {doc_id} in '{index_id}': "
+            f"{len(doc_chunks) - len(new_positions)} unchanged, "
+            f"{len(new_positions)} new, {len(vanished_ids)} removed chunks"
+        )
+        return ids, vanished_ids
+
+    def delete_chunks(self, index_id: str, ids: List[str]):
+        if not ids:
+            return
+        collection = self.chroma_pool.find_collection(index_id)
+        if collection is not None:
+            page_size = min(DELETE_PAGE_SIZE, self.chroma_client.get_max_batch_size())
+            for start in range(0, len(ids), page_size):
+                collection.delete(ids=ids[start : start + page_size])
+        self.lexical_index.delete(index_id, ids)
+
+    def rebuild_lexical_index(self, index_id: str) -> int:
+        collection = self.chroma_pool.get_collection(index_id)
+        results = collection.get(include=["documents", "metadatas"])
+        self.lexical_index.drop(index_id)
+        self.lexical_index.add(
+            index_id, results["ids"], results["documents"], results["metadatas"]
+        )
+        self.log.info(
+            f"Lexical index of '{index_id}' rebuilt with {len(results['ids'])} chunks"
+        )
+        return len(results["ids"])
+
+    def save_document_text(self, index_id: str, doc_id: int, text: str):
+        self.text_store.put(index_id, doc_id, text)
+
+    def get_document_text(self, index_id: str, doc_id: int):
+        return self.text_store.get(index_id, doc_id)
+
+    def delete_by_id(self, doc_id: int, index_id: str):
+        with self.session_factory() as session:
+            documents = self.get_document_query(
+                session, db_entities.DocumentOperation, index_id, doc_id
+            ).all()
+            source_path = documents[0].source_path if documents else str(doc_id)
+            legacy_ids = [
+                chunk_id
+                for document in documents
+                if document.db_gen_id
+                for chunk_id in document.db_gen_id.split(",")
+            ]
+        self.delete_chunks(index_id, legacy_ids)
+
+        # page through the chunk rows so a huge document never loads at once,
+        # an interrupted delete resumes with the rows that are left
+        while True:
+            with self.session_factory() as session:
+                rows = (
+                    self.get_document_query(
+                        session, db_entities.DocumentChunk, index_id, doc_id
+                    )
+                    .with_entities(
+                        db_entities.DocumentChunk.id, db_entities.DocumentChunk.chroma_id
+                    )
+                    .order_by(db_entities.DocumentChunk.ordinal)
+                    .limit(DELETE_PAGE_SIZE)
+                    .all()
                 )
+                if not rows:
+                    break
+                self.delete_chunks(index_id, [chroma_id for _, chroma_id in rows])
+                session.query(db_entities.DocumentChunk).filter(
+                    db_entities.DocumentChunk.id.in_([row_id for row_id, _ in rows])
+                ).delete(synchronize_session=False)
+                session.commit()
+
+        # chunks of an ingest that failed before its rows were written, deleted
+        # page by page so the filter query stays bounded
+        collection = self.chroma_pool.find_collection(index_id)
+        while collection is not None:
+            leftover = collection.get(
+                where={"doc_id": doc_id}, include=[], limit=DELETE_PAGE_SIZE
+            )
+            if not leftover["ids"]:
+                break
+            self.delete_chunks(index_id, leftover["ids"])
+
+        with self.session_factory() as session:
+            self.get_document_query(
+                session, db_entities.DocumentOperation, index_id, doc_id
+            ).delete(synchronize_session=False)
+            session.commit()
+        self.text_store.delete(index_id, doc_id)
+
+        self.log.info(
+            f"Document '{os.path.basename(source_path)}' deleted from '{index_id}' collection and database."
+        )
         return True
 
     def delete_index(self, index_id: str):
 
         try:
-            self.chroma_client.delete_collection(index_id)
+            self.chroma_pool.delete_collection(index_id)
+            self.text_store.delete_index(index_id)
+            self.lexical_index.drop(index_id)
 
             with self.session_factory() as session:
-                session.query(db_entities.DocumentOperation).filter(
-                    db_entities.DocumentOperation.index_id == index_id
-                ).delete(synchronize_session=False)
+                for entity in (db_entities.DocumentChunk, db_entities.DocumentOperation):
+                    session.query(entity).filter(entity.index_id == index_id).delete(
+                        synchronize_session=False
+                    )
                 session.commit()
 
                 self.log.info(
@@ -165,14 +484,7 @@ class DocRepository:
 
     def get_prompt_by_prompt_name(self, promptName: str):
         try:
-            with self.session_factory() as session:
-                document = (
-                    session.query(db_entities.Prompts)
-                    .filter(db_entities.Prompts.prompt_name == promptName)
-                    .first()
-                )
-
-                return document.prompt if document else ""
+            return self.prompt_registry.get(promptName)
 
         except Exception as e:
             self.log.error(
@@ -180,6 +492,9 @@ class DocRepository:
             )
             return ""
 
+    def get_prompt_version(self) -> int:
+        return self.prompt_registry.get_version()
+
     def get_json_template_by_id(self, temp_id: str):
         try:
             with self.session_factory() as session:
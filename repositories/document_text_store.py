@@ -0,0 +1,64 @@
+import logging
+import mmap
+import os
+import re
+import shutil
+import unicodedata
+import uuid
+import zlib
+from typing import Optional
+
+
+def normalize_document_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+class DocumentTextStore:
+    """zlib compressed full text of each document, one file per index and doc_id"""
+
+    def __init__(self, base_dir: str = "./document_text", compression_level: int = 6):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.base_dir = base_dir
+        self.compression_level = compression_level
+
+    def get_index_dir(self, index_id: str) -> str:
+        return os.path.join(self.base_dir, str(index_id))
+
+    def get_path(self, index_id: str, doc_id: int) -> str:
+        return os.path.join(self.get_index_dir(index_id), f"{doc_id}.txt.z")
+
+    def put(self, index_id: str, doc_id: int, text: str):
+        path = self.get_path(index_id, doc_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(
+            normalize_document_text(text).encode("utf-8"), self.compression_level
+        )
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+        self.log.info(
+            f"Stored text of document {doc_id} in '{index_id}' ({len(data)} bytes)"
+        )
+
+    def get(self, index_id: str, doc_id: int) -> Optional[str]:
+        path = self.get_path(index_id, doc_id)
+        try:
+            with open(path, "rb") as fp:
+                if os.fstat(fp.fileno()).st_size == 0:
+                    return ""
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return zlib.decompress(mm).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def delete(self, index_id: str, doc_id: int):
+        try:
+            os.remove(self.get_path(index_id, doc_id))
+        except FileNotFoundError:
+            pass
+
+    def delete_index(self, index_id: str):
+        shutil.rmtree(self.get_index_dir(index_id), ignore_errors=True)
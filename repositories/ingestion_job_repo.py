@@ -0,0 +1,92 @@
+import logging
+from contextlib import AbstractContextManager
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from entities import db_entities, server_entities
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+OCR = "ocr"
+EMBEDDING = "embedding"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED_STATUSES = {DONE, FAILED}
+
+
+def get_job_status(file_statuses: List[str]) -> str:
+    if not file_statuses:
+        return DONE
+    if all(status == QUEUED for status in file_statuses):
+        return QUEUED
+    if not all(status in FINISHED_STATUSES for status in file_statuses):
+        return "running"
+    return FAILED if FAILED in file_statuses else DONE
+
+
+class IngestionJobRepository:
+    def __init__(
+        self,
+        session_factory: Callable[..., AbstractContextManager[Session]],
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.session_factory = session_factory
+
+    def create_job(self, job_id: str, index_id: str, file_data: List):
+        with self.session_factory() as session:
+            session.add_all(
+                [
+                    db_entities.IngestionJobFile(
+                        job_id=job_id,
+                        index_id=index_id,
+                        file_id=file_info.fileId,
+                        file_path=file_info.filePath,
+                        status=QUEUED,
+                    )
+                    for file_info in file_data
+                ]
+            )
+            session.commit()
+        self.log.info(f"Queued ingestion job '{job_id}' with {len(file_data)} files")
+
+    def set_file_status(
+        self, job_id: str, file_id: int, status: str, message: Optional[str] = None
+    ):
+        with self.session_factory() as session:
+            session.query(db_entities.IngestionJobFile).filter(
+                db_entities.IngestionJobFile.job_id == job_id,
+                db_entities.IngestionJobFile.file_id == file_id,
+            ).update(
+                {"status": status, "message": message}, synchronize_session=False
+            )
+            session.commit()
+
+    def get_job(self, job_id: str) -> Optional[server_entities.IngestionJob]:
+        with self.session_factory() as session:
+            rows = (
+                session.query(db_entities.IngestionJobFile)
+                .filter(db_entities.IngestionJobFile.job_id == job_id)
+                .order_by(db_entities.IngestionJobFile.id)
+                .all()
+            )
+            if not rows:
+                return None
+
+            files = [
+                server_entities.IngestionFileStatus(
+                    fileId=row.file_id,
+                    filePath=row.file_path,
+                    status=row.status,
+                    message=row.message,
+                    updated=row.updated,
+                )
+                for row in rows
+            ]
+            return server_entities.IngestionJob(
+                jobId=job_id,
+                indexId=rows[0].index_id,
+                status=get_job_status([file.status for file in files]),
+                files=files,
+            )
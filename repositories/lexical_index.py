@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from typing import List, Optional
+
+TOKEN_PATTERN = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def build_match_query(query: str) -> str:
+    # quote every term so ids like "ABC-123" are never parsed as fts syntax
+    terms = dict.fromkeys(term.lower() for term in TOKEN_PATTERN.findall(query))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+class LexicalIndex:
+    """SQLite FTS5 index per collection, searched with bm25
+
+    chunk_ids maps each chunk id to the rowid of its fts row, fts columns
+    marked UNINDEXED can only be matched by scanning the whole table.
+    """
+
+    def __init__(self, base_dir: str = "./lexical_index"):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.base_dir = base_dir
+
+        self._lock = threading.Lock()
+        self._initialized = set()
+
+    def get_path(self, collection_name: str) -> str:
+        return os.path.join(self.base_dir, f"{collection_name}.sqlite")
+
+    def connect(self, collection_name: str) -> sqlite3.Connection:
+        path = self.get_path(collection_name)
+        with self._lock:
+            ready = collection_name in self._initialized and os.path.exists(path)
+        if not ready:
+            os.makedirs(self.base_dir, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        if not ready:
+            self.create_schema(conn)
+            with self._lock:
+                self._initialized.add(collection_name)
+        return conn
+
+    @staticmethod
+    def create_schema(conn: sqlite3.Connection):
+        # journal mode is stored in the database file, it only needs setting once
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            # immediate, so concurrent first connections create the schema once
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                "chunk_id UNINDEXED, doc_id UNINDEXED, metadata UNINDEXED, content, "
+                "tokenize = \"unicode61 tokenchars '-_'\")"
+            )
+            has_ids = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'chunk_ids'"
+            ).fetchone()
+            if has_ids:
+                return
+            conn.execute("CREATE TABLE chunk_ids (chunk_id TEXT PRIMARY KEY)")
+            # indexes written before chunk_ids existed, keep one row per id
+            conn.execute(
+                "DELETE FROM chunks WHERE rowid NOT IN "
+                "(SELECT MIN(rowid) FROM chunks GROUP BY chunk_id)"
+            )
+            conn.execute(
+                "INSERT INTO chunk_ids (rowid, chunk_id) "
+                "SELECT rowid, chunk_id FROM chunks"
+            )
+
+    @staticmethod
+    def delete_rows(conn: sqlite3.Connection, ids: List[str]):
+        rowids = []
+        for chunk_id in ids:
+            row = conn.execute(
+                "SELECT rowid FROM chunk_ids WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            if row is not None:
+                rowids.append(row)
+        conn.executemany("DELETE FROM chunks WHERE rowid = ?", rowids)
+        conn.executemany("DELETE FROM chunk_ids WHERE rowid = ?", rowids)
+
+    def add(
+        self,
+        collection_name: str,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+    ):
+        with closing(self.connect(collection_name)) as conn, conn:
+            # re-adding an id replaces its row, a resumed ingest never duplicates
+            self.delete_rows(conn, ids)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                rowid = conn.execute(
+                    "INSERT INTO chunk_ids (chunk_id) VALUES (?)", (chunk_id,)
+                ).lastrowid
+                conn.execute(
+                    "INSERT INTO chunks (rowid, chunk_id, doc_id, metadata, content) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        rowid,
+                        chunk_id,
+                        str(metadata.get("doc_id")),
+                        json.dumps(metadata),
+                        text,
+                    ),
+                )
+
+    def delete(self, collection_name: str, ids: List[str]):
+        if not os.path.exists(self.get_path(collection_name)):
+            return
+        with closing(self.connect(collection_name)) as conn, conn:
+            self.delete_rows(conn, ids)
+
+    def drop(self, collection_name: str):
+        with self._lock:
+            self._initialized.discard(collection_name)
+        path = self.get_path(collection_name)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(f"{path}{suffix}")
+            except FileNotFoundError:
+                pass
+
+    def search(
+        self,
+        collection_name: str,
+        query: str,
+        k: int = 10,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[dict]:
+        match_query = build_match_query(query)
+        if not match_query or not os.path.exists(self.get_path(collection_name)):
+            return []
+
+        sql = (
+            "SELECT chunk_id, metadata, content, bm25(chunks) AS score "
+            "FROM chunks WHERE chunks MATCH ?"
+        )
+        params = [match_query]
+        if document_ids:
+            sql += f" AND doc_id IN ({','.join('?' * len(document_ids))})"
+            params += [str(doc_id) for doc_id in document_ids]
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+
+        with closing(self.connect(collection_name)) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            {
+                "id": chunk_id,
+                "content": content,
+                "metadata": json.loads(metadata),
+                "score": -score,
+            }
+            for chunk_id, metadata, content, score in rows
+        ]
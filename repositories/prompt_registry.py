@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+import traceback
+from contextlib import AbstractContextManager
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from entities import db_entities
+
+
+class PromptRegistry:
+    """In-memory copy of the prompts table, refreshed on a TTL or on demand
+
+    Only the first load blocks, TTL reloads run in a background thread, so
+    get_version is a cheap check agents can run on every request.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[..., AbstractContextManager[Session]],
+        ttl_seconds: float = 300,
+    ):
+        self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+
+        self.version = 0
+        self.loaded_at = None
+        self._prompts = {}
+        self._missing = set()
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def reload(self) -> int:
+        with self.session_factory() as session:
+            rows = (
+                session.query(db_entities.Prompts.prompt_name, db_entities.Prompts.prompt)
+                .order_by(db_entities.Prompts.id)
+                .all()
+            )
+
+        prompts = {}
+        for prompt_name, prompt in rows:
+            prompts.setdefault(prompt_name, prompt)
+
+        with self._lock:
+            self._missing = set()
+            if prompts != self._prompts:
+                self._prompts = prompts
+                self.version += 1
+                self.log.info(
+                    f"Loaded {len(prompts)} prompts, registry version {self.version}"
+                )
+            self.loaded_at = time.monotonic()
+            return self.version
+
+    def refresh(self):
+        try:
+            self.reload()
+        except Exception:
+            # keep serving the last good copy, retry on the next TTL expiry
+            self.log.error("Prompt registry reload failed: %s", traceback.format_exc())
+            self.loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def ensure_fresh(self):
+        if self.loaded_at is None:
+            self.refresh()
+            return
+        if time.monotonic() - self.loaded_at < self.ttl_seconds:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self.refresh, name="prompt-registry-reload", daemon=True
+        ).start()
+
+    def get_version(self) -> int:
+        self.ensure_fresh()
+        return self.version
+
+    def get(self, prompt_name: str) -> str:
+        self.ensure_fresh()
+        prompt = self._prompts.get(prompt_name)
+        if prompt is not None:
+            return prompt
+        if prompt_name in self._missing:
+            return ""
+
+        # rows added since the last load, served by the prompt_name index
+        with self.session_factory() as session:
+            document = (
+                session.query(db_entities.Prompts)
+                .filter(db_entities.Prompts.prompt_name == prompt_name)
+                .first()
+            )
+            if document is None:
+                with self._lock:
+                    self._missing.add(prompt_name)
+                return ""
+            with self._lock:
+                self._prompts[prompt_name] = document.prompt
+                self.version += 1
+            return document.prompt
@@ -1,16 +1,24 @@
+import json
 import os
 
 from dotenv import load_dotenv
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
-from commands.document_service import DocumentService, DocChatService
+from commands.document_service import (
+    DocumentService,
+    DocChatService,
+    IngestionJobService,
+)
 from entities.server_entities import (
     DocumentInput,
     DocumentOutput,
+    IngestionJob,
     ResponseHeader,
     QueryRequest,
     QueryResponse,
 )
+from services import metrics, prompts
 
 load_dotenv(".env")
 
@@ -31,14 +39,18 @@ def get_code_message(response):
 def document_qa_service(document: DocumentInput) -> DocumentOutput:
     print(document)
     response = None
+    data = {}
     if document.operation.lower() in ["add", "update", "upload"]:
-        response = DocumentService().upload_input_docs(
+        file_statuses = DocumentService().upload_input_docs(
             str(document.id),
             document.name,
             document.operation,
             document.type,
             document.data,
+            max_workers=document.concurrency,
         )
+        response = all(status.success for status in file_statuses)
+        data = [status.model_dump() for status in file_statuses]
     elif document.operation.lower() == "delete":
         if document.data:
             response = DocumentService().delete_docs(str(document.id), document.data)
@@ -48,15 +60,69 @@ def document_qa_service(document: DocumentInput) -> DocumentOutput:
     message = f"{document.operation} {'successful' if response else 'failed'}."
     print(response, code, message)
     return DocumentOutput(
-        header=ResponseHeader(success=response, code=code, message=message), data={}
+        header=ResponseHeader(success=bool(response), code=code, message=message),
+        data=data,
+    )
+
+
+@router.post("/document/qa/jobs", tags=["Document Q&A"])
+def document_qa_job_service(document: DocumentInput) -> DocumentOutput:
+    print(document)
+    if document.operation.lower() not in ["add", "update", "upload"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Operation '{document.operation}' cannot run as a job.",
+        )
+    if not document.data:
+        raise HTTPException(status_code=400, detail="Job has no files to ingest.")
+    service = IngestionJobService()
+    if not service.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion jobs require a chroma server, use /document/qa instead.",
+        )
+    job_id = service.submit_job(document)
+    return DocumentOutput(
+        header=ResponseHeader(success=True, code=202, message="Ingestion job queued."),
+        data={"jobId": job_id},
     )
 
 
+@router.get("/document/qa/jobs/{job_id}", tags=["Document Q&A"])
+def document_qa_job_status(job_id: str) -> IngestionJob:
+    job = IngestionJobService().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+
 @router.post("/document/doc_chat", tags=["Document Q&A"])
-def doc_chat_service(
+async def doc_chat_service(
     query: QueryRequest,
 ) -> QueryResponse:
     print(query)
-    response = DocChatService().document_chat(query)
+    response = await DocChatService().adocument_chat(query)
     print(response)
     return response
+
+
+@router.post("/document/doc_chat/stream", tags=["Document Q&A"])
+async def doc_chat_stream_service(query: QueryRequest):
+    print(query)
+
+    async def ndjson_events():
+        async for event in DocChatService().astream_document_chat(query):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+
+@router.get("/document/metrics", tags=["Document Q&A"])
+def document_metrics():
+    return metrics.get_metrics()
+
+
+@router.post("/document/prompts/reload", tags=["Document Q&A"])
+def reload_prompts():
+    version = prompts.reload_prompts()
+    return {"message": "Prompts reloaded", "version": version}
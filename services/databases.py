@@ -3,7 +3,8 @@ import traceback
 from contextlib import contextmanager
 from urllib.parse import quote
 
-from sqlalchemy import create_engine, orm
+from sqlalchemy import String, Text, create_engine, inspect, orm, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
 
@@ -48,6 +49,51 @@ class Database:
     def create_database(self) -> None:
         Base.metadata.create_all(self._engine)
 
+    def create_indexes(self) -> None:
+        # create_all skips tables that already exist, add their new indexes here
+        inspector = inspect(self._engine)
+        failed = []
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                self._log.warning(f"Table {table.name} does not exist, run create-db")
+                continue
+            self.migrate_indexed_columns(inspector, table)
+            for index in table.indexes:
+                try:
+                    index.create(self._engine, checkfirst=True)
+                except SQLAlchemyError:
+                    self._log.error(
+                        f"Creating index {index.name} failed: {traceback.format_exc()}"
+                    )
+                    failed.append(index.name)
+        if failed:
+            self._log.error(f"Indexes not created: {', '.join(failed)}")
+
+    def migrate_indexed_columns(self, inspector, table) -> None:
+        # MySQL cannot index TEXT, older tables declared some of these columns so
+        if self._engine.dialect.name != 'mysql':
+            return
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        indexed = {column.name for index in table.indexes for column in index.columns}
+        preparer = self._engine.dialect.identifier_preparer
+        for name in sorted(indexed):
+            column = table.columns[name]
+            if not isinstance(column.type, String) or not column.type.length:
+                continue
+            if not isinstance(existing.get(name), Text):
+                continue
+            column_type = column.type.compile(dialect=self._engine.dialect)
+            ddl = (
+                f"ALTER TABLE {preparer.quote(table.name)} MODIFY {preparer.quote(name)} "
+                f"{column_type} {'NULL' if column.nullable else 'NOT NULL'}"
+            )
+            try:
+                with self._engine.begin() as connection:
+                    connection.execute(text(ddl))
+                self._log.info(f"Changed {table.name}.{name} from TEXT to {column_type}")
+            except SQLAlchemyError:
+                self._log.error(f"{ddl} failed: {traceback.format_exc()}")
+
     @contextmanager
     def session(self):
         session: Session = self._session_factory()
@@ -0,0 +1,23 @@
+from dependency_injector.wiring import inject, Provide
+
+from commands.ocr_service import ocr_cache
+from common.s3_file_cache import S3FileCache
+from container import Container
+from repositories.answer_cache import AnswerCache
+from repositories.chroma_client_pool import ChromaClientPool
+
+
+@inject
+def get_metrics(
+    chroma_pool: ChromaClientPool = Provide[Container.chroma_pool],
+    answer_cache: AnswerCache = Provide[Container.answer_cache],
+    file_cache: S3FileCache = Provide[Container.s3_file_cache],
+):
+    return {
+        "answer_cache": answer_cache.stats(),
+        "chroma_pool": chroma_pool.stats(),
+        "embedding_cache": chroma_pool.embedding_function.stats(),
+        "embedding_executor": chroma_pool.embedding_function.embeddings.stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "s3_file_cache": file_cache.stats(),
+    }
@@ -0,0 +1,11 @@
+from dependency_injector.wiring import inject, Provide
+
+from container import Container
+from repositories.prompt_registry import PromptRegistry
+
+
+@inject
+def reload_prompts(
+    prompt_registry: PromptRegistry = Provide[Container.prompt_registry],
+):
+    return prompt_registry.reload()